@@ -0,0 +1,205 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import unicodedata
+from collections import Counter
+
+import numpy as np
+
+# BM25 어휘(lexical) 검색용 inverted index
+# - 한글은 형태소 분석기 없이 음절 bigram으로 자른다 (조사가 붙어도 어간 bigram이 일치)
+# - 영문/숫자 덩어리(계정코드, 규정 번호 등)는 통째로 하나의 token
+# - postings는 CSR 형태의 numpy 배열(.npy)로 저장하고 mmap으로 열어서, 여는 시간과 상주 메모리가 작다
+#   term_hash.npy : 정렬된 term hash (uint64) -> searchsorted로 term 번호를 찾는다
+#   indptr.npy    : term t의 postings = [indptr[t], indptr[t+1])
+#   post_rows.npy / post_tf.npy : 문서 행 번호(int32) / 출현 횟수(uint16)
+#   doc_len.npy / row_ids.npy   : 행별 token 수 / 행 번호 -> chunk id
+# - 추가된 chunk는 그 chunk들만으로 만든 segment(같은 형식의 디렉토리)로 따로 저장하고, 검색 시 bm25_segments로 합친다
+
+_HANGUL_RUN = re.compile(r"[가-힣]+|[0-9A-Za-z][0-9A-Za-z\-\.]*")
+_MAX_TOKEN_LEN = 32
+
+
+def tokenize(text):
+    """한글은 음절 bigram (한 글자 단어는 unigram), 영문/숫자는 소문자로 통째로"""
+    tokens = []
+    for m in _HANGUL_RUN.finditer(unicodedata.normalize("NFC", text).lower()):
+        run = m.group()
+        if run[0] < "가":
+            tokens.append(run.rstrip(".-")[:_MAX_TOKEN_LEN])
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def _term_hash(term):
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def build_bm25(path, ids, texts, k1=1.2, b=0.75):
+    """
+    (ids[i], texts[i]) 문서들로 BM25 index를 만들어 path 디렉토리에 저장 (기존 index는 교체)
+    """
+    vocab = {}
+    post_term, post_row, post_tf = [], [], []
+    doc_len = np.zeros(len(texts), dtype=np.int32)
+    for row, text in enumerate(texts):
+        counts = Counter(tokenize(text))
+        doc_len[row] = sum(counts.values())
+        for term, tf in counts.items():
+            post_term.append(vocab.setdefault(term, len(vocab)))
+            post_row.append(row)
+            post_tf.append(min(tf, 65535))
+
+    hashes = np.fromiter((_term_hash(t) for t in vocab), dtype=np.uint64, count=len(vocab))
+    hash_order = np.argsort(hashes)
+    rank = np.empty_like(hash_order)
+    rank[hash_order] = np.arange(len(hash_order))
+    post_term = rank[np.asarray(post_term, dtype=np.int64)] if post_term else np.empty(0, dtype=np.int64)
+    order = np.argsort(post_term, kind="stable")
+
+    tmp = path + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    np.save(os.path.join(tmp, "term_hash.npy"), hashes[hash_order])
+    np.save(os.path.join(tmp, "indptr.npy"),
+            np.concatenate([[0], np.cumsum(np.bincount(post_term, minlength=len(vocab)))]).astype(np.int64))
+    np.save(os.path.join(tmp, "post_rows.npy"), np.asarray(post_row, dtype=np.int32)[order])
+    np.save(os.path.join(tmp, "post_tf.npy"), np.asarray(post_tf, dtype=np.uint16)[order])
+    np.save(os.path.join(tmp, "doc_len.npy"), doc_len)
+    np.save(os.path.join(tmp, "row_ids.npy"), np.asarray(ids, dtype=np.int64))
+    meta = {"n_docs": len(texts), "avgdl": float(doc_len.mean()) if len(texts) else 0.0, "k1": k1, "b": b,
+            "max_id": int(max(ids)) if len(ids) else -1}
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+
+
+class bm25_index:
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        load = lambda name: np.load(os.path.join(path, name), mmap_mode="r")
+        self.term_hash = load("term_hash.npy")
+        self.indptr = load("indptr.npy")
+        self.post_rows = load("post_rows.npy")
+        self.post_tf = load("post_tf.npy")
+        self.doc_len = load("doc_len.npy")
+        self.row_ids = load("row_ids.npy")
+
+    def close(self):
+        """mmap으로 연 배열을 놓는다 (참조가 사라지면 파일이 닫힌다)"""
+        self.term_hash = self.indptr = self.post_rows = self.post_tf = self.doc_len = self.row_ids = None
+
+    @property
+    def max_id(self):
+        """index에 들어있는 가장 큰 chunk id (이후에 추가된 chunk가 있는지 확인용)"""
+        return self.meta["max_id"]
+
+    def _postings(self, h):
+        """term hash h의 postings 범위 (lo, hi), 없으면 None"""
+        t = int(np.searchsorted(self.term_hash, h))
+        if t >= len(self.term_hash) or self.term_hash[t] != h:
+            return None
+        return int(self.indptr[t]), int(self.indptr[t + 1])
+
+    def search(self, query, k):
+        """
+        반환 결과 : BM25 점수 내림차순 [(chunk id, 점수), ...] 최대 k개
+        """
+        n_docs, avgdl = self.meta["n_docs"], self.meta["avgdl"]
+        k1, b = self.meta["k1"], self.meta["b"]
+        rows, scores = [], []
+        for term in set(tokenize(query)):
+            span = self._postings(np.uint64(_term_hash(term)))
+            if span is None:
+                continue
+            lo, hi = span
+            r = np.asarray(self.post_rows[lo:hi])
+            tf = np.asarray(self.post_tf[lo:hi], dtype=np.float32)
+            idf = np.log(1.0 + (n_docs - (hi - lo) + 0.5) / ((hi - lo) + 0.5))
+            norm = k1 * (1.0 - b + b * self.doc_len[r] / avgdl)
+            rows.append(r)
+            scores.append(idf * tf * (k1 + 1.0) / (tf + norm))
+        if not rows:
+            return []
+
+        rows, scores = np.concatenate(rows), np.concatenate(scores)
+        if len(rows) * 8 < n_docs:
+            # 일치하는 문서가 적으면 등장한 행만 모아서 합산
+            uniq, inv = np.unique(rows, return_inverse=True)
+            total = np.bincount(inv, weights=scores)
+        else:
+            # 흔한 term이 섞이면 전체 행 길이의 배열에 바로 합산하는 쪽이 빠르다
+            total = np.bincount(rows, weights=scores, minlength=n_docs)
+            uniq = np.flatnonzero(total)
+            total = total[uniq]
+        top = np.argpartition(-total, k - 1)[:k] if len(total) > k else np.arange(len(total))
+        top = top[np.argsort(-total[top])]
+        return [(int(self.row_ids[uniq[i]]), float(total[i])) for i in top]
+
+
+class bm25_segments:
+    """
+    여러 segment(bm25_index 디렉토리)를 하나의 index처럼 검색
+    문서 수, 평균 길이, term별 문서 빈도(df)는 모든 segment를 합쳐서 계산하므로 전체를 한 번에 만든 index와 점수가 같다
+    """
+    def __init__(self, paths):
+        self.segments = [bm25_index(p) for p in paths]
+        self.n_docs = sum(seg.meta["n_docs"] for seg in self.segments)
+        total_len = sum(seg.meta["avgdl"] * seg.meta["n_docs"] for seg in self.segments)
+        self.avgdl = total_len / self.n_docs if self.n_docs else 0.0
+
+    def close(self):
+        for seg in self.segments:
+            seg.close()
+
+    def search(self, query, k):
+        """
+        반환 결과 : BM25 점수 내림차순 [(chunk id, 점수), ...] 최대 k개
+        """
+        if len(self.segments) == 1:
+            return self.segments[0].search(query, k)
+        ids, scores = [], []
+        for term in set(tokenize(query)):
+            h = np.uint64(_term_hash(term))
+            found = [(seg, seg._postings(h)) for seg in self.segments]
+            found = [(seg, span) for seg, span in found if span is not None]
+            if not found:
+                continue
+            df = sum(hi - lo for _, (lo, hi) in found)
+            idf = np.log(1.0 + (self.n_docs - df + 0.5) / (df + 0.5))
+            for seg, (lo, hi) in found:
+                k1, b = seg.meta["k1"], seg.meta["b"]
+                r = np.asarray(seg.post_rows[lo:hi])
+                tf = np.asarray(seg.post_tf[lo:hi], dtype=np.float32)
+                norm = k1 * (1.0 - b + b * seg.doc_len[r] / self.avgdl)
+                ids.append(np.asarray(seg.row_ids[r]))
+                scores.append(idf * tf * (k1 + 1.0) / (tf + norm))
+        if not ids:
+            return []
+
+        # chunk id는 한 segment에만 들어있다
+        uniq, inv = np.unique(np.concatenate(ids), return_inverse=True)
+        total = np.bincount(inv, weights=np.concatenate(scores))
+        top = np.argpartition(-total, k - 1)[:k] if len(total) > k else np.arange(len(total))
+        top = top[np.argsort(-total[top])]
+        return [(int(uniq[i]), float(total[i])) for i in top]
+
+
+def reciprocal_rank_fusion(rankings, k, rrf_k=60):
+    """
+    여러 순위 list([id, ...])를 RRF(score = sum 1 / (rrf_k + 순위))로 합친다
+    반환 결과 : [(id, rrf 점수), ...] 최대 k개
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, i in enumerate(ranking):
+            fused[i] = fused.get(i, 0.0) + 1.0 / (rrf_k + rank + 1)
+    return sorted(fused.items(), key=lambda kv: -kv[1])[:k]
@@ -0,0 +1,90 @@
+import hashlib
+import unicodedata
+
+import numpy as np
+
+# 중복 chunk 찾기 (index 구축 전에 같은 내용을 한 번만 임베딩/저장하기 위해)
+# - 완전 중복 : 정규화(NFC, 소문자, 공백 정리)한 텍스트의 hash가 같으면 중복
+# - 유사 중복 : 글자 shingle(기본 5글자) 집합의 MinHash signature를 band로 나눠 LSH bucket에 넣고,
+#   같은 bucket에 들어간 후보 중 추정 Jaccard 유사도가 threshold 이상이면 중복
+# - 앞에 나온 텍스트가 대표(canonical)가 되고, 대표끼리만 bucket에 넣는다 (중복의 중복이 사슬처럼 이어지지 않게)
+
+_PRIME = (1 << 31) - 1
+
+
+def _normalize(text):
+    return " ".join(unicodedata.normalize("NFC", text).lower().split())
+
+
+def _shingle_hashes(text, shingle):
+    """text의 글자 shingle들을 32bit hash로 (numpy로 한 번에 계산)"""
+    cp = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    if len(cp) <= shingle:
+        cp = np.concatenate([cp, np.zeros(shingle - len(cp) + 1, dtype=np.uint64)])
+    h = np.zeros(len(cp) - shingle + 1, dtype=np.uint64)
+    for j in range(shingle):
+        h = h * np.uint64(1_000_003) + cp[j:len(cp) - shingle + 1 + j] # uint64 overflow는 mod 2^64로 동작
+    h ^= h >> np.uint64(29)
+    h *= np.uint64(0xBF58476D1CE4E5B9)
+    h ^= h >> np.uint64(32)
+    return np.unique(h & np.uint64(0xFFFFFFFF)).astype(np.int64)
+
+
+class minhash_lsh:
+    def __init__(self, num_perm=64, bands=8, shingle=5, seed=0):
+        if num_perm % bands:
+            raise ValueError(f"num_perm({num_perm})은 bands({bands})로 나누어 떨어져야 합니다")
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, _PRIME, num_perm, dtype=np.int64)[:, None]
+        self.b = rng.integers(0, _PRIME, num_perm, dtype=np.int64)[:, None]
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle = shingle
+
+    def signature(self, text):
+        """(num_perm,) MinHash signature : 순열 (a*h + b) mod p 마다 shingle hash의 최소값"""
+        h = _shingle_hashes(text, self.shingle)
+        return ((self.a * (h % _PRIME) + self.b) % _PRIME).min(axis=1)
+
+    def band_keys(self, sig):
+        return [(i, sig[i * self.rows:(i + 1) * self.rows].tobytes()) for i in range(self.bands)]
+
+
+def find_duplicates(texts, threshold=0.9, near=True, num_perm=64, bands=8, shingle=5):
+    """
+    반환 결과 : canonical (int64 array), canonical[i] = texts[i]의 대표 위치 (중복이 아니면 i 자신)
+    near=False면 완전 중복만 찾는다
+    """
+    canonical = np.arange(len(texts), dtype=np.int64)
+    seen = {}
+    lsh = minhash_lsh(num_perm, bands, shingle) if near else None
+    buckets = {}
+    sigs = {}
+    for i, text in enumerate(texts):
+        norm = _normalize(text)
+        key = hashlib.blake2b(norm.encode("utf-8"), digest_size=16).digest()
+        if key in seen:
+            canonical[i] = seen[key]
+            continue
+        seen[key] = i
+        if lsh is None:
+            continue
+
+        sig = lsh.signature(norm)
+        keys = lsh.band_keys(sig)
+        match = None
+        for band_key in keys:
+            for j in buckets.get(band_key, ()):
+                if np.mean(sigs[j] == sig) >= threshold:
+                    match = j
+                    break
+            if match is not None:
+                break
+        if match is not None:
+            canonical[i] = match
+            seen[key] = match
+            continue
+        sigs[i] = sig
+        for band_key in keys:
+            buckets.setdefault(band_key, []).append(i)
+    return canonical
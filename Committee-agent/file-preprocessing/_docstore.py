@@ -0,0 +1,281 @@
+import json
+import mmap
+import os
+import re
+
+import numpy as np
+
+# id -> 문장 저장소 (JSON sidecar 대체)
+# - <base>.blob : 모든 문장의 UTF-8 bytes를 이어붙인 파일 (추가만 하고 기존 byte는 고치지 않는다)
+# - <base>.offs : (n, 2) int64 표, i번째 행 = id i의 (blob 내 시작 위치, byte 길이), 길이 -1 = 없는 id
+# 두 파일 모두 mmap으로 열기 때문에 여는 시간은 corpus 크기와 무관하고, 실제로 읽은 page만 메모리에 올라간다
+# offs 표는 다른 경로(예: 세대별 <base>.<세대>.offs)에 둘 수 있다 : append / remove에 새 경로를 주면 열려 있는 표를 덮어쓰지 않는다
+
+
+def _write_file(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def write_docstore(base, docs):
+    """
+    {id: 문장} 전체를 새로 기록 (기존 파일은 교체)
+    """
+    ids = np.fromiter(docs.keys(), dtype=np.int64, count=len(docs))
+    n_rows = int(ids.max()) + 1 if len(ids) else 0
+    offs = np.zeros((n_rows, 2), dtype=np.int64)
+    offs[:, 1] = -1
+    chunks, pos = [], 0
+    for i, text in docs.items():
+        b = text.encode("utf-8")
+        offs[int(i)] = (pos, len(b))
+        chunks.append(b)
+        pos += len(b)
+    _write_file(base + ".blob", b"".join(chunks))
+    _write_file(base + ".offs", offs.tobytes())
+
+
+def convert_json_docstore(json_path, base):
+    """기존 JSON sidecar({"0": "문장", ...})를 binary 저장소로 변환"""
+    with open(json_path, "r", encoding="utf-8") as f:
+        docs = {int(k): v for k, v in json.load(f).items()}
+    write_docstore(base, docs)
+    print(f"docstore 변환 완료 : {json_path} -> {base}.blob/.offs ({len(docs)}건)")
+
+
+class mmap_docstore:
+    def __init__(self, base, offs_path=None):
+        self.base = base
+        self.offs_path = offs_path or base + ".offs"
+        self._open()
+
+    def _open(self):
+        self._blob = None
+        self._blob_file = None
+        size = os.path.getsize(self.offs_path)
+        self._offs = (np.memmap(self.offs_path, dtype=np.int64, mode="r").reshape(-1, 2)
+                      if size else np.empty((0, 2), dtype=np.int64))
+        if os.path.getsize(self.base + ".blob"):
+            self._blob_file = open(self.base + ".blob", "rb")
+            self._blob = mmap.mmap(self._blob_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        if self._blob is not None:
+            self._blob.close()
+            self._blob_file.close()
+        self._blob = None
+        self._offs = np.empty((0, 2), dtype=np.int64)
+
+    @property
+    def n_rows(self):
+        """id 공간의 크기 (= 가장 큰 id + 1, 삭제된 id 포함)"""
+        return len(self._offs)
+
+    def __contains__(self, i):
+        return 0 <= i < len(self._offs) and self._offs[i, 1] >= 0
+
+    def __getitem__(self, i):
+        if i not in self:
+            raise KeyError(i)
+        start, length = self._offs[i]
+        return self._blob[start:start + length].decode("utf-8")
+
+    def get(self, i, default=None):
+        return self[i] if i in self else default
+
+    def live_ids(self):
+        """삭제되지 않은 id들 (int64 array)"""
+        return np.flatnonzero(self._offs[:, 1] >= 0)
+
+    def append(self, ids, texts, offs_path=None):
+        """
+        blob 끝에 texts를 이어 쓰고 offs 표만 새로 기록 (기존 문장은 다시 쓰지 않는다)
+        offs_path를 주면 표를 그 경로에 쓰고 이후 그 표를 사용한다 (없으면 현재 표를 교체)
+        중간에 실패해도 blob 끝에 참조되지 않는 byte만 남는다
+        """
+        offs = np.array(self._offs)
+        n_rows = max(len(offs), int(max(ids)) + 1)
+        if n_rows > len(offs):
+            pad = np.zeros((n_rows - len(offs), 2), dtype=np.int64)
+            pad[:, 1] = -1
+            offs = np.vstack([offs, pad])
+        with open(self.base + ".blob", "ab") as f:
+            pos = f.tell()
+            for i, text in zip(ids, texts):
+                b = text.encode("utf-8")
+                offs[int(i)] = (pos, len(b))
+                f.write(b)
+                pos += len(b)
+            f.flush()
+            os.fsync(f.fileno())
+        self._write_offs(offs, offs_path)
+
+    def remove(self, ids, offs_path=None):
+        """ids의 길이를 -1로 표시 (blob의 byte는 다음 전체 재작성 때 정리된다). offs_path는 append와 같다"""
+        offs = np.array(self._offs)
+        ids = np.asarray([i for i in ids if i in self], dtype=np.int64)
+        offs[ids, 1] = -1
+        self._write_offs(offs, offs_path)
+
+    def _write_offs(self, offs, offs_path):
+        self.close()
+        self.offs_path = offs_path or self.offs_path
+        _write_file(self.offs_path, offs.tobytes())
+        self._open()
+
+
+# chunk metadata 저장소 (<base>.attrs/)
+# - metadata.blob/.offs : id별 metadata 전체(JSON 문자열)를 mmap_docstore 형식으로 저장
+# - fields.json + <field>.npy : filter에 쓰는 범주형 field(예: source)는 값 목록과 id별 값 번호(int32, 없으면 -1)로 저장
+# - 중복 제거로 합쳐진 chunk(metadata의 "duplicates")는 중복들의 field 값도 <field>.extra.npy에 (id, 값 번호) 쌍으로 저장
+# - 검색 시 filter 값마다 id bitmap(np.packbits, little bit order = faiss IDSelectorBitmap 형식)을 한 번 만들어 캐시
+# - version을 주면 metadata.offs, fields.json, <field>.npy, <field>.extra.npy를 <이름>.<version>.<확장자>로 기록한다
+#   (append마다 새 version 파일을 쓰므로 다른 검색기가 열어둔 이전 version 파일은 그대로 남는다, metadata.blob은 이어 쓰기만 한다)
+
+
+def _field_values(m, field):
+    """metadata m과 m["duplicates"](중복 제거로 합쳐진 chunk들의 metadata)에 있는 field 값들 (중복 없이, 순서 유지)"""
+    values = []
+    for d in [m] + list(m.get("duplicates", [])):
+        if d and field in d and str(d[field]) not in values:
+            values.append(str(d[field]))
+    return values
+
+
+def _write_npy(path, arr):
+    tmp = path + ".tmp.npy"
+    np.save(tmp, arr)
+    os.replace(tmp, path)
+
+
+_VERSIONED_FILE = re.compile(r"^.+\.(\d+)(?:\.offs|\.json|\.extra\.npy|\.npy)$")
+
+
+def remove_attribute_versions(path, keep_versions):
+    """
+    attribute_store 디렉토리에서 keep_versions(None = version 없는 예전 이름)에 속하지 않는 파일을 지운다
+    metadata.blob은 모든 version이 같이 쓰므로 남긴다. 열려 있어서 못 지우는 파일(Windows)은 다음에 다시 시도
+    """
+    for name in os.listdir(path):
+        if name == "metadata.blob":
+            continue
+        m = _VERSIONED_FILE.match(name)
+        if (int(m.group(1)) if m else None) in keep_versions:
+            continue
+        try:
+            os.remove(os.path.join(path, name))
+        except OSError:
+            pass
+
+
+class attribute_store:
+    def __init__(self, path, fields=("source",), version=None):
+        self.path = path
+        self.version = version
+        os.makedirs(path, exist_ok=True)
+        meta_base = os.path.join(path, "metadata")
+        if not os.path.exists(self._file("metadata", ".offs")):
+            if not os.path.exists(meta_base + ".blob"):
+                _write_file(meta_base + ".blob", b"")
+            _write_file(self._file("metadata", ".offs"), b"")
+        self._meta = mmap_docstore(meta_base, self._file("metadata", ".offs"))
+        self.fields = {}  # field -> 값 list
+        if os.path.exists(self._file("fields", ".json")):
+            with open(self._file("fields", ".json"), "r", encoding="utf-8") as f:
+                self.fields = json.load(f)
+        for field in fields:
+            self.fields.setdefault(field, [])
+        self._codes = {f: self._load_codes(f) for f in self.fields}
+        self._extra = {f: self._load_extra(f) for f in self.fields}
+        self._bitmaps = {}
+
+    def _file(self, stem, ext):
+        """현재 version의 파일 경로 stem.<version>.ext (version이 None이면 예전 형식 stem.ext)"""
+        name = f"{stem}{ext}" if self.version is None else f"{stem}.{self.version}{ext}"
+        return os.path.join(self.path, name)
+
+    def _load_codes(self, field):
+        path = self._file(field, ".npy")
+        return np.load(path, mmap_mode="r") if os.path.exists(path) else np.empty(0, dtype=np.int32)
+
+    def _load_extra(self, field):
+        path = self._file(field, ".extra.npy")
+        return np.load(path) if os.path.exists(path) else np.empty((0, 2), dtype=np.int32)
+
+    def close(self):
+        self._meta.close()
+        # field 값 번호(.npy)의 mmap은 참조가 사라지면 닫힌다
+        self._codes = {f: np.empty(0, dtype=np.int32) for f in self.fields}
+        self._bitmaps = {}
+
+    def get(self, i):
+        """id i의 metadata dict (없으면 빈 dict)"""
+        raw = self._meta.get(i)
+        return json.loads(raw) if raw is not None else {}
+
+    def append(self, ids, metadatas, version=None):
+        """
+        ids[i]의 metadata를 기록 (이미 있는 id면 덮어쓴다)
+        version을 주면 그 version의 파일에 기록하고 이후 그 version을 사용한다 (없으면 현재 version 파일을 교체)
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        if version is not None:
+            self.version = version
+        self._meta.append(ids, [json.dumps(m or {}, ensure_ascii=False) for m in metadatas], self._file("metadata", ".offs"))
+        n_rows = self._meta.n_rows
+        for field, values in self.fields.items():
+            lookup = {v: c for c, v in enumerate(values)}
+            codes = np.full(n_rows, -1, dtype=np.int32)
+            codes[:len(self._codes[field])] = self._codes[field]
+            extra = self._extra[field]
+            extra = [tuple(row) for row in extra[~np.isin(extra[:, 0], ids)]]
+            for i, m in zip(ids, metadatas):
+                codes[i] = -1
+                for n, key in enumerate(_field_values(m or {}, field)):
+                    if key not in lookup:
+                        lookup[key] = len(values)
+                        values.append(key)
+                    if n == 0:
+                        codes[i] = lookup[key]
+                    else:
+                        extra.append((i, lookup[key]))
+            self._codes[field] = None # 같은 version이면 자기 mmap을 놓아야 Windows에서 파일을 교체할 수 있다
+            _write_npy(self._file(field, ".npy"), codes)
+            self._codes[field] = self._load_codes(field)
+            if len(extra) or len(self._extra[field]):
+                _write_npy(self._file(field, ".extra.npy"), np.asarray(extra, dtype=np.int32).reshape(-1, 2))
+                self._extra[field] = self._load_extra(field)
+        with open(self._file("fields", ".json.tmp"), "w", encoding="utf-8") as f:
+            json.dump(self.fields, f, ensure_ascii=False)
+        os.replace(self._file("fields", ".json.tmp"), self._file("fields", ".json"))
+        self._bitmaps = {}
+
+    def bitmap(self, filters, n_rows):
+        """
+        filters = {field: 값 또는 값 list} 를 만족하는 id의 bitmap (field 사이는 AND, 값 list는 OR)
+        반환 결과 : ceil(n_rows / 8) byte uint8 array
+        """
+        result = None
+        for field, wanted in filters.items():
+            if field not in self.fields:
+                raise ValueError(f"filter로 쓸 수 없는 field : {field} (가능 : {list(self.fields)})")
+            wanted = [wanted] if isinstance(wanted, (str, int)) else list(wanted)
+            bits = None
+            for value in wanted:
+                key = (field, str(value))
+                if key not in self._bitmaps:
+                    codes = self._codes[field]
+                    values = self.fields[field]
+                    mask = np.zeros(n_rows, dtype=bool)
+                    if str(value) in values:
+                        code = values.index(str(value))
+                        hit = np.flatnonzero(codes == code)
+                        extra = self._extra[field]
+                        hit = np.concatenate([hit, extra[extra[:, 1] == code, 0]])
+                        mask[hit[hit < n_rows]] = True
+                    self._bitmaps[key] = np.packbits(mask, bitorder="little")
+                bits = self._bitmaps[key] if bits is None else bits | self._bitmaps[key]
+            result = bits if result is None else result & bits
+        return result
@@ -0,0 +1,149 @@
+import os
+
+import numpy as np
+
+from _embed_client import llama_embedding_client
+from _hash_embed import hash_embed
+
+# 임베딩 backend
+# backend는 아래 두 가지만 있으면 된다 (faiss_vector_db의 client 자리에 그대로 들어간다)
+# - embed(texts) : (N, D) float32, 행마다 L2 정규화된 임베딩. 빈 입력이면 ValueError
+# - model : 임베딩 캐시 key에 쓰는 이름 (backend나 모델이 다르면 다른 이름이어야 캐시가 섞이지 않는다)
+# 제공하는 backend
+# - "llama" : llama-server /v1/embeddings HTTP client (llama_embedding_client)
+# - "onnx"  : ONNX Runtime으로 로컬 모델 파일을 같은 프로세스에서 실행 (HTTP/JSON 변환 없음, onnxruntime + tokenizers 필요)
+#   max_length token보다 긴 텍스트는 잘라 버리지 않고 max_length token window들로 나눠 임베딩한 뒤 token 수 가중 평균 (llama client와 같은 방식)
+# - "hash"  : 모델 없는 hashing 벡터 (test / benchmark용)
+
+
+class onnx_embedding_backend:
+    """
+    model_path : transformer encoder를 export한 .onnx (예: bge-m3)
+    tokenizer_path : HuggingFace tokenizers의 tokenizer.json
+    pooling : "cls" (bge 계열 dense 임베딩) 또는 "mean"
+    출력이 이미 (batch, D) 문장 임베딩인 모델은 pooling 없이 그대로 사용한다
+    max_length : 모델에 한 번에 넣는 window 길이 (special token 포함). 긴 텍스트는 window_stride token씩 겹치는
+    여러 window로 나눠 임베딩한다 (attention 비용은 길이의 제곱이므로 모델 한도(bge-m3 8192)보다 짧게 두는 편이 빠르다)
+    """
+    def __init__(self, model_path, tokenizer_path, model=None, max_length=512, batch_size=16, threads=None,
+                 pooling="cls", window_stride=32):
+        try:
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise ImportError("onnx backend를 쓰려면 onnxruntime과 tokenizers를 설치해야 합니다 "
+                              "(pip install onnxruntime tokenizers)") from e
+        if pooling not in ("cls", "mean"):
+            raise ValueError(f"지원하지 않는 pooling : {pooling}")
+        self.model = model or os.path.splitext(os.path.basename(model_path))[0]
+        self.batch_size = batch_size
+        self.pooling = pooling
+
+        opts = ort.SessionOptions()
+        if threads:
+            opts.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, sess_options=opts, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        # max_length를 넘는 부분은 encoding.overflowing에 다음 window들로 담긴다 (각 window에 special token 포함)
+        self.tokenizer.enable_truncation(max_length, stride=window_stride)
+        self.tokenizer.no_padding() # window별로 나눈 뒤 batch 단위로 직접 padding
+        pad = self.tokenizer.token_to_id("<pad>")
+        self._pad_id = pad if pad is not None else (self.tokenizer.token_to_id("[PAD]") or 0)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _run(self, windows):
+        """windows : token id list들. 반환 결과 : (len(windows), D) 임베딩"""
+        width = max(len(w) for w in windows)
+        ids = np.full((len(windows), width), self._pad_id, dtype=np.int64)
+        mask = np.zeros((len(windows), width), dtype=np.int64)
+        for r, w in enumerate(windows):
+            ids[r, :len(w)] = w
+            mask[r, :len(w)] = 1
+        feed = {"input_ids": ids, "attention_mask": mask, "token_type_ids": np.zeros_like(ids)}
+        out = self.session.run(None, {k: v for k, v in feed.items() if k in self._input_names})[0]
+        if out.ndim == 2:
+            return out
+        if self.pooling == "cls":
+            return out[:, 0]
+        m = mask[:, :, None].astype(np.float32)
+        return (out * m).sum(axis=1) / np.maximum(m.sum(axis=1), 1.0)
+
+    def embed(self, texts):
+        """
+        반환 결과 : (N, D) float32 numpy array (i번째 행 = texts[i]의 정규화된 임베딩)
+        max_length보다 긴 텍스트는 window별 벡터를 정규화한 뒤 token 수 가중 평균으로 합친다
+        길이가 비슷한 window끼리 batch로 묶어 padding을 줄인다
+        """
+        texts = list(texts)
+        if not texts:
+            raise ValueError("임베딩할 텍스트가 없습니다")
+        # windows[j]는 texts[owner[j]]의 일부
+        windows, owner = [], []
+        for pos, enc in enumerate(self.tokenizer.encode_batch(texts)):
+            for w in [enc] + list(enc.overflowing):
+                windows.append(w.ids)
+                owner.append(pos)
+        order = np.argsort([len(w) for w in windows], kind="stable")
+        vecs = None
+        for start in range(0, len(windows), self.batch_size):
+            rows = order[start:start + self.batch_size]
+            batch_vecs = self._run([windows[j] for j in rows])
+            if vecs is None:
+                vecs = np.empty((len(windows), batch_vecs.shape[1]), dtype=np.float32)
+            vecs[rows] = batch_vecs
+        if len(windows) == len(texts):
+            out = vecs # 잘린 텍스트가 없으면 windows[j] = texts[j]
+        else:
+            vecs /= (np.linalg.norm(vecs, axis=1, keepdims=True) + 1e-12)
+            weight = np.asarray([len(w) for w in windows], dtype=np.float32)
+            out = np.zeros((len(texts), vecs.shape[1]), dtype=np.float32)
+            np.add.at(out, np.asarray(owner), vecs * weight[:, None])
+        out /= (np.linalg.norm(out, axis=1, keepdims=True) + 1e-12)
+        return out
+
+
+class hashing_embedding_backend:
+    """모델 없이 _hash_embed.hash_embed로 만드는 결정적 벡터 (test / benchmark용)"""
+    def __init__(self, dim=1024):
+        self.dim = dim
+        self.model = f"hash-{dim}"
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def embed(self, texts):
+        texts = list(texts)
+        if not texts:
+            raise ValueError("임베딩할 텍스트가 없습니다")
+        return hash_embed(texts, self.dim)
+
+
+def make_embedding_backend(backend="llama", **options):
+    """
+    설정 이름으로 backend 생성
+    backend="llama" : llama_embedding_client(server, model, batch_size, ...) 의 인자
+    backend="onnx"  : onnx_embedding_backend(model_path, tokenizer_path, ...) 의 인자
+    backend="hash"  : hashing_embedding_backend(dim)
+    """
+    if backend == "llama":
+        return llama_embedding_client(**options)
+    if backend == "onnx":
+        return onnx_embedding_backend(**options)
+    if backend == "hash":
+        return hashing_embedding_backend(**options)
+    raise ValueError(f"지원하지 않는 embedding backend : {backend}")
@@ -0,0 +1,225 @@
+import hashlib
+import json
+import os
+import threading
+import unicodedata
+from collections import OrderedDict
+from contextlib import contextmanager
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+import numpy as np
+
+# 디스크 임베딩 캐시
+# - key = hash(model 이름, 정규화된 텍스트) 16 byte
+# - 벡터는 (max_entries, D) 크기의 memory-mapped 행렬(vectors.bin)에 저장하고, key -> 행 번호(slot) 표로 찾는다
+# - max_entries를 넘으면 가장 오래 사용되지 않은 항목(LRU)의 slot을 재사용한다
+# - 각 slot에 실제로 들어 있는 key를 keys.bin((max_entries, 16) memmap)에 같이 기록하고, 읽을 때 확인한다
+#   (index 파일은 flush() 때만 바뀌므로, 비정상 종료 후나 여러 프로세스가 같은 캐시를 쓸 때 key가 다른 벡터를 가리킬 수 있다)
+# - 쓰기는 파일 lock(cache.lock)으로 프로세스 간에 직렬화한다
+# - LRU 순서는 flush()를 호출해야 index 파일에 반영된다
+
+
+def _normalize(text):
+    """유니코드 NFC 정규화 + 공백 정리 (공백만 다른 텍스트는 같은 key가 되도록)"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def _cache_key(model, text):
+    return hashlib.blake2b(f"{model}\x00{_normalize(text)}".encode("utf-8"), digest_size=16).digest()
+
+
+@contextmanager
+def _file_lock(path):
+    """프로세스 간 배타 lock (같은 프로세스 안에서도 중첩해서 잡으면 안 된다)"""
+    with open(path, "a+b") as f:
+        if os.name == "nt":
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError: # LK_LOCK은 10초 기다린 뒤 실패한다 -> 계속 기다린다
+                    pass
+        else:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if os.name == "nt":
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class embedding_cache:
+    def __init__(self, cache_dir, max_entries=200_000, dtype="float16"):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.dtype = np.dtype(dtype)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._slots = OrderedDict() # key -> slot, 오래된 것부터 최근 사용 순서
+        self._free = []
+        self._dim = None
+        self._vecs = None
+        self._keys = None # slot -> 그 slot에 들어 있는 key (비어 있으면 0)
+        os.makedirs(cache_dir, exist_ok=True)
+        with _file_lock(self._path("cache.lock")):
+            self._load()
+
+    def _path(self, name):
+        return os.path.join(self.cache_dir, name)
+
+    def _load(self):
+        """파일 lock을 잡은 상태에서 호출"""
+        if not os.path.exists(self._path("meta.json")):
+            return
+        with open(self._path("meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta["dtype"] != self.dtype.name or meta["capacity"] != self.max_entries:
+            raise ValueError(f"캐시 설정 불일치 : 저장된 {meta}, 요청 dtype={self.dtype.name}, max_entries={self.max_entries}")
+        if not os.path.exists(self._path("keys.bin")):
+            self._convert_legacy()
+        self._open_matrix(meta["dim"], "r+")
+        self._read_slots()
+
+    def _convert_legacy(self):
+        """keys.bin이 없던 이전 형식 : index.npz가 맞는지 확인할 수 없으므로 빈 캐시로 시작한다"""
+        keys = np.memmap(self._path("keys.bin"), dtype=np.uint8, mode="w+", shape=(self.max_entries, 16))
+        keys.flush()
+        del keys
+        if os.path.exists(self._path("index.npz")):
+            os.remove(self._path("index.npz"))
+
+    def _open_matrix(self, dim, mode):
+        self._dim = dim
+        self._vecs = np.memmap(self._path("vectors.bin"), dtype=self.dtype, mode=mode,
+                               shape=(self.max_entries, dim))
+        self._keys = np.memmap(self._path("keys.bin"), dtype=np.uint8, mode=mode,
+                               shape=(self.max_entries, 16))
+
+    def _read_slots(self):
+        """
+        keys.bin을 기준으로 key -> slot 표를 만든다.
+        index.npz는 LRU 순서에만 쓰고, keys.bin과 다른 항목(flush 이후 덮어쓴 slot)은 버린다.
+        index.npz에 없는 slot(flush 전에 종료, 다른 프로세스가 기록)은 가장 오래된 항목으로 둔다.
+        """
+        stored = np.asarray(self._keys)
+        order = []
+        if os.path.exists(self._path("index.npz")):
+            idx = np.load(self._path("index.npz"))
+            keys, slots = idx["keys"].reshape(-1, 16), idx["slots"]
+            order = slots[np.all(stored[slots] == keys, axis=1)].tolist()
+        listed = set(order)
+        order = [s for s in np.flatnonzero(stored.any(axis=1)).tolist() if s not in listed] + order
+        self._slots = OrderedDict()
+        for slot in order:
+            key = stored[slot].tobytes()
+            old = self._slots.pop(key, None)
+            if old is not None: # 두 프로세스가 같은 key를 다른 slot에 기록한 경우 : 오래된 쪽을 비운다
+                self._keys[old] = 0
+            self._slots[key] = slot
+        used = set(self._slots.values())
+        self._free = [s for s in range(self.max_entries - 1, -1, -1) if s not in used]
+
+    def _ensure_matrix(self, dim):
+        """파일 lock을 잡은 상태에서 호출"""
+        if self._vecs is None and os.path.exists(self._path("meta.json")):
+            self._load() # 다른 프로세스가 먼저 만들었다
+        if self._vecs is not None:
+            if dim != self._dim:
+                raise ValueError(f"임베딩 차원 불일치 : 캐시 {self._dim}, 입력 {dim}")
+            return
+        self._open_matrix(dim, "w+")
+        self._free = list(range(self.max_entries - 1, -1, -1))
+        meta = {"dim": self._dim, "dtype": self.dtype.name, "capacity": self.max_entries}
+        with open(self._path("meta.tmp.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(self._path("meta.tmp.json"), self._path("meta.json"))
+
+    def _take_slot(self):
+        """빈 slot (다른 프로세스가 이미 채운 slot은 건너뛴다), 없으면 LRU 항목의 slot"""
+        while self._free:
+            slot = self._free.pop()
+            if not self._keys[slot].any():
+                return slot
+        if not self._slots: # 다른 프로세스가 이 프로세스의 slot을 모두 덮어썼다 -> keys.bin에서 다시 읽는다
+            self._read_slots()
+            if self._free:
+                return self._free.pop()
+        _, slot = self._slots.popitem(last=False)
+        self.evictions += 1
+        return slot
+
+    def get_many(self, model, texts):
+        """
+        반환 결과 : (found, missing)
+        found = {입력 위치: float32 벡터}, missing = 캐시에 없는 입력 위치 list
+        """
+        found, missing = {}, []
+        with self._lock:
+            for pos, t in enumerate(texts):
+                key = _cache_key(model, t)
+                slot = self._slots.get(key)
+                # key 확인 : 다른 프로세스가 이 slot을 덮어썼을 수 있다. 복사 후에도 확인해서 쓰는 도중의 벡터를 걸러낸다
+                if slot is not None and self._keys[slot].tobytes() == key:
+                    vec = np.array(self._vecs[slot], dtype=np.float32) # 복사 : 같은 호출의 put_many가 이 slot을 덮어쓸 수 있다
+                    if self._keys[slot].tobytes() == key:
+                        self._slots.move_to_end(key)
+                        found[pos] = vec
+                        continue
+                if slot is not None:
+                    del self._slots[key]
+                missing.append(pos)
+            self.hits += len(found)
+            self.misses += len(missing)
+        return found, missing
+
+    def put_many(self, model, texts, vecs):
+        """texts[i]의 벡터 vecs[i]를 저장. 자리가 없으면 LRU 항목을 밀어낸다"""
+        vecs = np.asarray(vecs, dtype=np.float32)
+        with self._lock, _file_lock(self._path("cache.lock")):
+            self._ensure_matrix(vecs.shape[1])
+            for t, v in zip(texts, vecs):
+                key = _cache_key(model, t)
+                slot = self._slots.get(key)
+                if slot is None or self._keys[slot].tobytes() != key:
+                    slot = self._take_slot()
+                self._slots[key] = slot
+                self._slots.move_to_end(key)
+                # key를 지우고 -> 벡터 -> key 순서로 기록 : 중간에 읽거나 종료되어도 key와 벡터가 어긋나지 않는다
+                self._keys[slot] = 0
+                self._vecs[slot] = v
+                self._keys[slot] = np.frombuffer(key, dtype=np.uint8)
+
+    def flush(self):
+        """벡터 행렬, slot key와 LRU 순서(index 파일)를 디스크에 기록 (index는 임시 파일 작성 후 rename)"""
+        with self._lock, _file_lock(self._path("cache.lock")):
+            if self._vecs is None:
+                return
+            self._vecs.flush()
+            self._keys.flush()
+            keys = np.frombuffer(b"".join(self._slots.keys()), dtype=np.uint8).reshape(-1, 16)
+            slots = np.fromiter(self._slots.values(), dtype=np.int64, count=len(self._slots))
+            tmp = self._path("index.tmp.npz")
+            np.savez(tmp, keys=keys, slots=slots)
+            os.replace(tmp, self._path("index.npz"))
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._slots),
+            "capacity": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,274 @@
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+# llama-server(/v1/embeddings) 전용 임베딩 client
+# - requests.Session으로 keep-alive connection을 재사용
+# - ThreadPoolExecutor로 최대 concurrency개의 요청을 동시에 보낸다 (llama-server의 -np 슬롯 수와 맞추면 된다)
+# - 요청 단위 timeout / retry
+# - max_input_tokens보다 긴 텍스트는 여러 window로 잘라 같은 요청 흐름에 섞어 보내고, window 벡터를 token 수 가중 평균해서 하나로 합친다
+#   (llama-server는 -ub보다 긴 입력을 임베딩하지 못한다)
+
+
+class EmbeddingError(RuntimeError):
+    """
+    일부 텍스트의 임베딩이 실패했을 때 발생
+    failed : {입력 위치(int): 실패 사유(str)}
+    """
+    def __init__(self, failed):
+        self.failed = dict(sorted(failed.items()))
+        preview = ", ".join(f"{i}: {msg}" for i, msg in list(self.failed.items())[:5])
+        super().__init__(f"embedding API 실패 ({len(self.failed)}건) : {preview}")
+
+
+class _RetryableError(RuntimeError):
+    """timeout, 연결 오류, 5xx 처럼 다시 보내면 성공할 수 있는 오류"""
+
+
+def _estimate_tokens(text):
+    """
+    토크나이저 없이 토큰 수를 보수적으로 추정
+    한글 음절은 UTF-8로 3 byte이고 대략 1 token 이하, 영문/숫자는 3~4글자에 1 token 정도이므로
+    byte 수 / 3 을 사용하고 BOS/EOS 2개를 더한다
+    """
+    return len(text.encode("utf-8")) // 3 + 2
+
+
+_SPLIT_POINT = re.compile(r"(?<=[.!?。다요])\s+|\n+")
+_TOO_LARGE = re.compile(r"too large|physical batch", re.IGNORECASE) # llama-server가 -ub보다 긴 입력을 거절할 때의 메시지
+_MAX_RESPLIT = 6
+
+
+class llama_embedding_client:
+    def __init__(self, server="HTTP://127.0.0.1:8081", model="bge-m3", batch_size=32, max_batch_tokens=2048,
+                 concurrency=4, timeout=45, retries=2, backoff=0.5, max_input_tokens=None):
+        self.server = server
+        self.model = model
+        self.batch_size = batch_size # 한 번의 /v1/embeddings 요청에 담을 최대 텍스트 수
+        self.max_batch_tokens = max_batch_tokens # llama-server의 -b/-ub 값과 동일하게 맞출 것
+        self.concurrency = concurrency # 동시에 보내는 요청 수 상한 (llama-server의 -np와 동일하게 맞출 것)
+        self.timeout = timeout # 요청 1건당 timeout(초)
+        self.retries = retries # 재시도 횟수 (첫 시도 제외)
+        self.backoff = backoff # 재시도 간격(초), 시도할 때마다 2배
+        self.max_input_tokens = max_input_tokens or max_batch_tokens # 텍스트 1건의 최대 token 수, 넘으면 window로 분할
+        self._use_tokenizer = True
+        self.count_tokens = lru_cache(maxsize=8192)(self._count_tokens)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="embed")
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _count_tokens(self, text):
+        """
+        서버의 /tokenize로 실제 token 수를 센다 (BOS/EOS 2개 포함). 결과는 lru cache (count_tokens)
+        /tokenize가 없는 서버면 이후로는 _estimate_tokens 추정치를 사용
+        """
+        if self._use_tokenizer:
+            try:
+                r = self.session.post(f"{self.server}/tokenize", json={"content": text}, timeout=self.timeout)
+                if r.ok:
+                    return len(r.json()["tokens"]) + 2
+                if r.status_code == 404:
+                    self._use_tokenizer = False
+            except (requests.RequestException, ValueError, KeyError):
+                self._use_tokenizer = False
+        return _estimate_tokens(text)
+
+    def _fits(self, text):
+        # 추정치가 한도의 절반보다 작으면 tokenizer 호출 없이 통과 (추정이 크게 빗나가도 한도 안)
+        n_est = _estimate_tokens(text)
+        return n_est * 2 <= self.max_input_tokens or self.count_tokens(text) <= self.max_input_tokens
+
+    def _split_long(self, text):
+        """
+        max_input_tokens를 넘는 텍스트를 한도 안에 들어가는 window들로 자른다
+        window 수만큼 균등하게 나눈 위치에서 가장 가까운 문장 끝(다. 요. . ? ! 줄바꿈)을 자르는 위치로 쓰고,
+        그래도 한도를 넘는 window는 다시 자른다
+        반환 결과 : [(window 텍스트, 추정 token 수), ...]
+        """
+        if len(text) < 2 or self._fits(text):
+            return [(text, _estimate_tokens(text))] if text.strip() else []
+        n_windows = max(2, -(-self.count_tokens(text) // self.max_input_tokens))
+        step = len(text) // n_windows
+        cuts = [m.end() for m in _SPLIT_POINT.finditer(text)]
+        bounds = [0]
+        for i in range(1, n_windows):
+            want = i * step
+            near = [c for c in cuts if bounds[-1] < c < len(text) and abs(c - want) <= step // 4]
+            bounds.append(min(near, key=lambda c: abs(c - want)) if near else want)
+        bounds.append(len(text))
+        windows = []
+        for a, b in zip(bounds, bounds[1:]):
+            windows.extend(self._split_long(text[a:b]))
+        return windows
+
+    def _windows_of(self, text):
+        """text를 max_input_tokens 안에 들어가는 window 텍스트들로 (들어가면 [text])"""
+        if self._fits(text):
+            return [text]
+        return [w for w, _ in self._split_long(text)] or [text]
+
+    def _halve(self, text):
+        """가운데에서 가장 가까운 문장 끝(없으면 가운데)에서 둘로 자른다"""
+        mid = len(text) // 2
+        near = [m.end() for m in _SPLIT_POINT.finditer(text) if abs(m.end() - mid) <= len(text) // 4]
+        cut = min(near, key=lambda c: abs(c - mid)) if near else mid
+        return [part for part in (text[:cut], text[cut:]) if part.strip()]
+
+    def _make_batches(self, texts):
+        """
+        텍스트들을 batch_size와 max_batch_tokens를 넘지 않도록 묶는다
+        반환 결과 : 입력 위치(position)의 list들의 list
+        max_batch_tokens보다 긴 텍스트는 단독 batch로 보낸다(실패 여부는 서버가 판단)
+        """
+        batches, cur, cur_tokens = [], [], 0
+        for pos, t in enumerate(texts):
+            n_tok = _estimate_tokens(t)
+            if cur and (len(cur) >= self.batch_size or cur_tokens + n_tok > self.max_batch_tokens):
+                batches.append(cur)
+                cur, cur_tokens = [], 0
+            cur.append(pos)
+            cur_tokens += n_tok
+        if cur:
+            batches.append(cur)
+        return batches
+
+    def _post_once(self, inputs):
+        """
+        /v1/embeddings 한 번 호출. 응답의 index 순서대로 정렬된 (len(inputs), D) 배열 반환
+        """
+        try:
+            r = self.session.post(f"{self.server}/v1/embeddings", json={"model": self.model, "input": inputs},
+                                  timeout=self.timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise _RetryableError(str(e)) from e
+        if r.status_code >= 500 and _TOO_LARGE.search(r.text):
+            raise RuntimeError(f"HTTP {r.status_code}: {r.text[:200]}") # 다시 보내도 실패하므로 재시도하지 않는다
+        if r.status_code >= 500 or r.status_code == 429:
+            raise _RetryableError(f"HTTP {r.status_code}: {r.text[:200]}")
+        if not r.ok:
+            raise RuntimeError(f"HTTP {r.status_code}: {r.text[:200]}")
+        data = r.json().get("data")
+        if not data or len(data) != len(inputs):
+            raise RuntimeError(f"응답 개수 불일치 (요청 {len(inputs)}, 응답 {len(data or [])})")
+        data = sorted(data, key=lambda d: d.get("index", 0))
+        return np.asarray([d["embedding"] for d in data], dtype=np.float32)
+
+    def _post(self, inputs):
+        """재시도 가능한 오류는 backoff 후 retries번까지 다시 보낸다"""
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            try:
+                return self._post_once(inputs)
+            except _RetryableError:
+                if attempt == self.retries:
+                    raise
+                time.sleep(delay)
+                delay *= 2
+
+    def _embed_batch(self, texts, batch):
+        """
+        batch 하나를 임베딩. 반환 결과 : ({위치: 벡터}, {위치: 실패 사유})
+        batch 전체가 실패하면 어느 텍스트가 문제인지 한 건씩 다시 보내 확인한다
+        """
+        try:
+            vecs = self._post([texts[i] for i in batch])
+            return dict(zip(batch, vecs)), {}
+        except Exception as e:
+            if len(batch) == 1:
+                return {}, {batch[0]: str(e)}
+        rows, failed = {}, {}
+        for i in batch:
+            try:
+                rows[i] = self._post([texts[i]])[0]
+            except Exception as e:
+                failed[i] = str(e)
+        return rows, failed
+
+    def _embed_pieces(self, pieces, positions):
+        """
+        pieces 중 positions 위치의 텍스트를 batch로 묶어 동시에 임베딩
+        반환 결과 : ({위치: 벡터}, {위치: 실패 사유})
+        """
+        positions = list(positions)
+        sub = [pieces[j] for j in positions]
+        rows, failed = {}, {}
+        futures = [self._pool.submit(self._embed_batch, sub, b) for b in self._make_batches(sub)]
+        for fut in futures:
+            ok, bad = fut.result()
+            rows.update((positions[i], v) for i, v in ok.items())
+            failed.update((positions[i], msg) for i, msg in bad.items())
+        return rows, failed
+
+    def embed(self, texts):
+        """
+        texts를 batch로 묶어 최대 concurrency개의 요청을 동시에 보내 임베딩
+        max_input_tokens보다 긴 텍스트는 window로 잘라 임베딩한 뒤 token 수 가중 평균으로 합친다
+        반환 결과 : (N, D) float32 numpy array (i번째 행 = texts[i]의 정규화된 임베딩)
+        일부라도 실패하면 EmbeddingError(failed={위치: 사유}) 발생
+        """
+        texts = list(texts)
+        if not texts:
+            raise ValueError("임베딩할 텍스트가 없습니다")
+
+        # 긴 텍스트는 window로 펼친다 : pieces[j]는 texts[owner[j]]의 일부
+        # 추정치만으로 한도 안이라고 확신할 수 없는 텍스트는 /tokenize 확인과 분할을 thread pool에서 동시에 진행
+        uncertain = [pos for pos, t in enumerate(texts) if _estimate_tokens(t) * 2 > self.max_input_tokens]
+        split = dict(zip(uncertain, self._pool.map(self._windows_of, [texts[pos] for pos in uncertain])))
+        pieces, owner = [], []
+        for pos, t in enumerate(texts):
+            for w in split.get(pos, [t]):
+                pieces.append(w)
+                owner.append(pos)
+
+        rows, failed = self._embed_pieces(pieces, range(len(pieces)))
+        # tokenizer 없이 추정한 길이가 빗나가서 서버가 너무 길다고 거절한 window는 반으로 잘라 다시 보낸다
+        for _ in range(_MAX_RESPLIT):
+            too_large = [j for j, msg in failed.items() if _TOO_LARGE.search(msg) and len(pieces[j]) > 1]
+            if not too_large:
+                break
+            new = []
+            for j in too_large:
+                del failed[j]
+                for half in self._halve(pieces[j]):
+                    new.append(len(pieces))
+                    pieces.append(half)
+                    owner.append(owner[j])
+            more_rows, more_failed = self._embed_pieces(pieces, new)
+            rows.update(more_rows)
+            failed.update(more_failed)
+        if failed:
+            reasons = {}
+            for j, msg in sorted(failed.items()):
+                reasons.setdefault(owner[j], msg)
+            raise EmbeddingError(reasons)
+
+        done = sorted(rows)
+        piece_vecs = np.vstack([rows[j] for j in done]).astype("float32")
+        if len(pieces) == len(texts) and owner == list(range(len(texts))):
+            out = piece_vecs # 자르거나 다시 자른 텍스트가 없으면 pieces[j] = texts[j]
+        else:
+            # window 벡터를 정규화한 뒤 (추정) token 수 가중 평균
+            piece_vecs /= (np.linalg.norm(piece_vecs, axis=1, keepdims=True)+1e-12)
+            weight = np.asarray([_estimate_tokens(pieces[j]) for j in done], dtype=np.float32)
+            out = np.zeros((len(texts), piece_vecs.shape[1]), dtype=np.float32)
+            np.add.at(out, np.asarray([owner[j] for j in done]), piece_vecs * weight[:, None])
+        out /= (np.linalg.norm(out, axis=1, keepdims=True)+1e-12) # cosine similarity를 사용하기 위해서 정규화 실시
+        return out
@@ -1,7 +1,13 @@
-import requests
 import faiss
 import numpy as np
-import json, os
+import copy, json, os, re, shutil, threading, time
+from collections import namedtuple
+
+from _embed_backends import make_embedding_backend
+from _docstore import mmap_docstore, write_docstore, convert_json_docstore, attribute_store, remove_attribute_versions
+from _bm25 import bm25_segments, build_bm25, reciprocal_rank_fusion
+from _dedup import find_duplicates
+from _query_cache import query_cache
 
 # on-premise model을 local host server에 띄워둔 상태에서 진행
 # C:\Users\1598505\OneDrive - Standard Chartered Bank\5.Python\jupyter_notebook\2.Script\3.Automation\Report_agent\llama.cpp>llama-server.exe -m "C:/Users/1598505/OneDrive - Standard Chartered Bank/5.Python/AI/0.models/bge-m3-FP16.gguf" --embedding -t 8 -c 4092 -b 2048 -ub 2048 -np 1 -v --host 0.0.0.0 --port 8081
@@ -9,77 +15,1017 @@ import json, os
 # 다른 서버와의 충돌을 위하여 port 8080이 아닌 port 8081을 사용
 
 
+# 근사 검색 index 선택 기준 (ntotal 기준)
+# - 2만 건 미만 : IndexFlatIP (정확한 brute force)
+# - 20만 건 미만 : HNSW (graph 기반, 학습 불필요)
+# - 그 이상 : IVF-Flat (k-means로 nlist개의 cluster 학습, 검색 시 nprobe개 cluster만 탐색)
+# 메모리가 부족하면 압축 index를 직접 지정 (1024차원 기준 벡터당 byte)
+# - "fp16" : 2048 byte, "sq8" : 1024 byte, "pq" / "ivf_pq" : m byte (기본 m = D/16 = 64)
+# - rerank=n 이면 k*n개의 후보를 뽑은 뒤 디스크의 원본 벡터(.vecs)로 정확한 유사도를 다시 계산해서 k개를 고른다
+# 차원 축소 (reduce_dim) : index 앞에 VectorTransform(IndexPreTransform)을 두어 저장/검색 모두 축소된 차원으로 수행
+# - "pca" : 구축 시 PCA를 학습 / "truncate" : 앞쪽 reduce_dim개 성분만 사용
+# - 축소 후 다시 L2 정규화하므로 내적 = cosine 유지, query에도 같은 변환이 자동으로 적용된다
+# - .vecs에는 원래 차원의 벡터가 남아있어서 rerank와 recall 측정은 원래 차원 기준
+FLAT_MAX_NTOTAL = 20_000
+HNSW_MAX_NTOTAL = 200_000
+
+# filter 조건에 맞는 id가 이 수 이하이면 index 대신 원본 벡터(.vecs)로 정확히 계산한다
+# (조건이 까다로우면 HNSW/IVF는 탐색 범위 안에서 허용된 id를 k개 찾지 못한다)
+EXACT_FILTER_MAX = 20_000
+
+# add_texts는 추가된 chunk만으로 BM25 segment를 하나 만들어 붙이고, segment가 이 수에 이르면 전체를 하나로 다시 만든다
+# (검색 시간은 segment 수에 비례해서 늘어난다)
+BM25_MAX_SEGMENTS = 8
+
+
+def _ivf_nlist(ntotal):
+    # cluster당 학습 벡터가 39개 이상 있어야 faiss가 경고 없이 학습한다
+    return int(max(1, min(4 * np.sqrt(ntotal), ntotal // 39)))
+
+
+def _pq_params(dim, ntotal):
+    """sub-quantizer 수 m (D의 약수, 기본 D/16)과 code 당 bit 수 (학습 벡터가 적으면 줄인다)"""
+    m = max(d for d in range(1, max(1, dim // 16) + 1) if dim % d == 0)
+    nbits = int(min(8, max(1, np.log2(max(2, ntotal // 39)))))
+    return m, nbits
+
+
+def _choose_index_spec(ntotal, dim, index_type="auto", nprobe=None, ef_search=None, rerank=None,
+                       reduce_dim=None, reduce="pca"):
+    """
+    index 종류와 parameter를 정한다. 반환 결과는 index 옆에 meta json으로 같이 저장되어 검색 시 동일하게 적용된다
+    """
+    if reduce not in ("pca", "truncate"):
+        raise ValueError(f"지원하지 않는 reduce : {reduce}")
+    # PCA는 학습 벡터가 축소 차원보다 많아야 의미가 있다
+    reduced = bool(reduce_dim) and reduce_dim < dim and (reduce == "truncate" or ntotal > reduce_dim)
+    index_dim = int(reduce_dim) if reduced else dim
+
+    if index_type == "auto":
+        if ntotal < FLAT_MAX_NTOTAL:
+            index_type = "flat"
+        elif ntotal < HNSW_MAX_NTOTAL:
+            index_type = "hnsw"
+        else:
+            index_type = "ivf"
+
+    if index_type == "flat":
+        spec = {"type": "flat"}
+    elif index_type == "hnsw":
+        spec = {"type": "hnsw", "M": 32, "efConstruction": 200, "efSearch": ef_search or 128}
+    elif index_type in ("ivf", "ivf_pq"):
+        nlist = _ivf_nlist(ntotal)
+        spec = {"type": index_type, "nlist": nlist, "nprobe": min(nlist, nprobe or max(8, nlist // 64))}
+        if index_type == "ivf_pq":
+            spec["m"], spec["nbits"] = _pq_params(index_dim, ntotal)
+    elif index_type in ("sq8", "fp16"):
+        spec = {"type": index_type}
+    elif index_type == "pq":
+        m, nbits = _pq_params(index_dim, ntotal)
+        spec = {"type": "pq", "m": m, "nbits": nbits}
+    else:
+        raise ValueError(f"지원하지 않는 index_type : {index_type}")
+    if rerank and spec["type"] != "flat":
+        spec["rerank"] = int(rerank)
+    if reduced:
+        spec["reduce"] = reduce
+        spec["reduce_dim"] = index_dim
+    return spec
+
+
+def _train_sample(vectors, n_train):
+    if len(vectors) <= n_train:
+        return vectors
+    return vectors[np.sort(np.random.default_rng(0).choice(len(vectors), n_train, replace=False))]
+
+
+def _reduce_transform(dim, spec):
+    """spec의 차원 축소 변환 (축소 -> L2 정규화). 축소하지 않으면 None"""
+    if "reduce" not in spec:
+        return None
+    d_out = spec["reduce_dim"]
+    if spec["reduce"] == "pca":
+        first = faiss.PCAMatrix(dim, d_out)
+    else:
+        first = faiss.RemapDimensionsTransform(dim, d_out, False)
+    return [first, faiss.NormalizationTransform(d_out, 2.0)]
+
+
+def _build_index(vectors, ids, spec):
+    """
+    spec에 맞는 base index를 만들어(필요하면 학습) IndexIDMap2로 감싸고 vectors를 추가
+    차원 축소가 있으면 base index는 축소된 차원으로 만들고 IndexPreTransform으로 변환을 앞에 붙인다
+    """
+    chain = _reduce_transform(vectors.shape[1], spec)
+    dim = spec["reduce_dim"] if chain else vectors.shape[1]
+    IP = faiss.METRIC_INNER_PRODUCT
+    if spec["type"] == "flat":
+        base_index = faiss.IndexFlatIP(dim)
+    elif spec["type"] == "hnsw":
+        base_index = faiss.IndexHNSWFlat(dim, spec["M"], IP)
+        base_index.hnsw.efConstruction = spec["efConstruction"]
+    elif spec["type"] == "ivf":
+        base_index = faiss.IndexIVFFlat(faiss.IndexFlatIP(dim), dim, spec["nlist"], IP)
+    elif spec["type"] == "ivf_pq":
+        base_index = faiss.IndexIVFPQ(faiss.IndexFlatIP(dim), dim, spec["nlist"], spec["m"], spec["nbits"], IP)
+    elif spec["type"] == "sq8":
+        base_index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, IP)
+    elif spec["type"] == "fp16":
+        base_index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16, IP)
+    elif spec["type"] == "pq":
+        base_index = faiss.IndexPQ(dim, spec["m"], spec["nbits"], IP)
+    else:
+        raise ValueError(f"지원하지 않는 index type : {spec['type']}")
+    if chain:
+        base_index = faiss.IndexPreTransform(base_index)
+        for vt in reversed(chain):
+            base_index.prepend_transform(vt)
+    if not base_index.is_trained:
+        # IVF는 cluster당 256개, 그 외(SQ/PQ)는 최대 10만개면 학습에 충분하다
+        n_train = 256 * spec["nlist"] if "nlist" in spec else 100_000
+        base_index.train(_train_sample(vectors, n_train))
+    print("base_index 완성 : ", spec)
+    index = faiss.IndexIDMap2(base_index)
+    print("index map 완성")
+    index.add_with_ids(vectors, ids)
+    _apply_search_params(index, spec)
+    return index
+
+
+def _apply_search_params(index, spec):
+    """meta에 저장된 검색 parameter(nprobe, efSearch)를 index에 적용"""
+    ps = faiss.ParameterSpace()
+    if "nprobe" in spec:
+        ps.set_index_parameter(index, "nprobe", spec["nprobe"])
+    if "efSearch" in spec:
+        ps.set_index_parameter(index, "efSearch", spec["efSearch"])
+
+
+def _read_index(path, spec, mmap=False):
+    """
+    저장된 index를 읽는다. mmap=True면 index 파일을 복사하지 않고 memory-map으로 연다 (읽기 전용, 검색용)
+    - IVF 계열 : IO_FLAG_MMAP (inverted list를 mmap)
+    - flat / HNSW / SQ / PQ : IO_FLAG_MMAP_IFC (벡터 code 배열을 mmap, 지원하지 않는 faiss 버전이면 일반 read)
+    mmap으로 열 수 없으면 일반 read로 대체
+    """
+    if not mmap:
+        return faiss.read_index(path)
+    if spec["type"] in ("ivf", "ivf_pq"):
+        flag = faiss.IO_FLAG_MMAP
+    else:
+        flag = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+    if flag is None:
+        return faiss.read_index(path)
+    try:
+        return faiss.read_index(path, flag | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError as e:
+        print("mmap으로 index를 열 수 없어 일반 read로 대체 : ", str(e).splitlines()[0])
+        return faiss.read_index(path)
+
+
+def _atomic_write(path, write):
+    """
+    임시 파일에 쓴 뒤 os.replace로 교체해서, 중간에 죽어도 파일이 반쯤 써진 상태로 남지 않게 한다
+    """
+    tmp = path + ".tmp"
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def _dump_json(obj, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(obj, f, indent=2)
+
+
+def _supports_remove(index):
+    """
+    IndexIDMap2.remove_ids는 내부 index가 삭제 후 순번을 앞으로 당기는 경우(flat, SQ, PQ)에만 올바르게 동작한다
+    HNSW는 삭제 자체를 지원하지 않고, IVF는 순번을 당기지 않아 id 표가 어긋난다
+    """
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap2) else index
+    if isinstance(inner, faiss.IndexPreTransform):
+        inner = faiss.downcast_index(inner.index)
+    return isinstance(inner, (faiss.IndexFlat, faiss.IndexScalarQuantizer, faiss.IndexPQ))
+
+
+def _supports_selector(spec):
+    """IndexPQ는 IDSelector를 지원하지 않아서 검색 후에 걸러야 한다"""
+    return spec["type"] != "pq"
+
+
+def _selector_params(spec, bitmap):
+    """
+    bitmap(허용 id)으로 IDSelectorBitmap을 만들고 index 종류에 맞는 SearchParameters에 담는다
+    (IndexIDMap2가 내부 순번 <-> id 변환을 해준다. IDSelectorBitmap의 n은 bitmap의 byte 수)
+    """
+    sel = faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap))
+    if spec["type"] in ("ivf", "ivf_pq"):
+        params = faiss.SearchParametersIVF(sel=sel, nprobe=spec["nprobe"])
+    elif spec["type"] == "hnsw":
+        params = faiss.SearchParametersHNSW(sel=sel, efSearch=spec["efSearch"])
+    else:
+        params = faiss.SearchParameters(sel=sel)
+    params._refs = (sel, bitmap) # 검색이 끝날 때까지 selector와 bitmap이 해제되지 않도록
+    return params
+
+
+def _widen_search(spec, ntotal):
+    """filter 검색 결과가 k개 모이지 않을 때 탐색 범위(nprobe, efSearch)를 4배로 넓힌 spec. 더 넓힐 수 없으면 None"""
+    if spec["type"] in ("ivf", "ivf_pq") and spec["nprobe"] < spec["nlist"]:
+        return {**spec, "nprobe": min(spec["nlist"], spec["nprobe"] * 4)}
+    if spec["type"] == "hnsw" and spec["efSearch"] < ntotal:
+        return {**spec, "efSearch": min(ntotal, spec["efSearch"] * 4)}
+    return None
+
+
+def _in_bitmap(bitmap, i):
+    return 0 <= i < len(bitmap) * 8 and bool((bitmap[i >> 3] >> (i & 7)) & 1)
+
+
+def _exact_filtered(q_emb, vectors, ids, k):
+    """
+    허용된 id(ids, 오름차순)의 원본 벡터와 brute force 내적으로 top-k
+    반환 결과 : (D, I) - index.search와 같은 모양 (len(q_emb), k), 모자란 자리는 (-inf, -1)
+    """
+    D = np.full((len(q_emb), k), -np.inf, dtype=np.float32)
+    I = np.full((len(q_emb), k), -1, dtype=np.int64)
+    if len(ids) == 0:
+        return D, I
+    sims = q_emb @ np.asarray(vectors[ids], dtype=np.float32).T
+    top = np.argsort(-sims, axis=1)[:, :k]
+    D[:, :top.shape[1]] = np.take_along_axis(sims, top, axis=1)
+    I[:, :top.shape[1]] = ids[top]
+    return D, I
+
+
+def _search_vectors(index, q_emb, k, spec, vectors=None, params=None):
+    """
+    index.search 후, spec에 rerank가 있으면 k*rerank개의 후보를 원본 벡터(vectors, 행 번호 = id)로 다시 정렬
+    params : filter용 SearchParameters (_selector_params)
+    반환 결과 : (D, I) - index.search와 같은 모양 (len(q_emb), k)
+    """
+    rerank = spec.get("rerank")
+    if not rerank or vectors is None:
+        return index.search(q_emb, k, params=params)
+
+    D, I = index.search(q_emb, k * rerank, params=params)
+    D_out = np.full((len(q_emb), k), -np.inf, dtype=np.float32)
+    I_out = np.full((len(q_emb), k), -1, dtype=np.int64)
+    for row, (q, ids) in enumerate(zip(q_emb, I)):
+        ids = ids[ids != -1]
+        exact = np.asarray(vectors[ids]) @ q
+        top = np.argsort(-exact)[:k]
+        D_out[row, :len(top)] = exact[top]
+        I_out[row, :len(top)] = ids[top]
+    return D_out, I_out
+
+
+def _mmr(q, cand_vecs, k, lam):
+    """
+    maximal marginal relevance : lam * (query 유사도) - (1 - lam) * (이미 고른 것과의 최대 유사도) 가 큰 순서로 k개 선택
+    후보끼리의 유사도는 (n, n) 행렬곱 한 번으로 구한다 (벡터는 정규화되어 있으므로 내적 = cosine)
+    반환 결과 : 선택된 후보 위치 list
+    """
+    n = len(cand_vecs)
+    if n == 0:
+        return []
+    rel = cand_vecs @ q
+    sim = cand_vecs @ cand_vecs.T
+    selected = [int(np.argmax(rel))]
+    max_sim = sim[selected[0]].copy()
+    chosen = np.zeros(n, dtype=bool)
+    chosen[selected[0]] = True
+    for _ in range(min(k, n) - 1):
+        score = lam * rel - (1.0 - lam) * max_sim
+        score[chosen] = -np.inf
+        j = int(np.argmax(score))
+        selected.append(j)
+        chosen[j] = True
+        np.maximum(max_sim, sim[j], out=max_sim)
+    return selected
+
+
+def _exact_topk(queries, vectors, k, block=65536):
+    """vectors 전체와 brute force 내적으로 정확한 top-k id (flat baseline). vectors는 memmap이어도 된다"""
+    best_D = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+    best_I = np.empty((len(queries), 0), dtype=np.int64)
+    for start in range(0, len(vectors), block):
+        sims = queries @ np.asarray(vectors[start:start + block]).T
+        cand_D = np.hstack([best_D, sims])
+        cand_I = np.hstack([best_I, np.broadcast_to(np.arange(start, start + sims.shape[1]), sims.shape)])
+        top = np.argsort(-cand_D, axis=1)[:, :k]
+        best_D = np.take_along_axis(cand_D, top, axis=1)
+        best_I = np.take_along_axis(cand_I, top, axis=1)
+    return best_I
+
+
+def _recall_at_k(index, vectors, spec, k=10, n_queries=200):
+    """
+    저장된 벡터 중 n_queries개를 query로 사용해서 flat(brute force) 결과 대비 recall@k 측정
+    (자기 자신과 완전히 같은 query가 되지 않도록 약간의 noise를 더한다)
+    """
+    rng = np.random.default_rng(0)
+    picks = np.sort(rng.choice(len(vectors), min(n_queries, len(vectors)), replace=False))
+    queries = np.asarray(vectors[picks], dtype=np.float32)
+    queries = queries + rng.normal(0, 0.02, queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True) + 1e-12
+    truth = _exact_topk(queries, vectors, k)
+    _, found = _search_vectors(index, queries, k, spec, vectors)
+    hits = sum(len(np.intersect1d(t, f[f != -1])) for t, f in zip(truth, found))
+    return hits / truth.size
+
+
 class faiss_vector_db:
-    def __init__(self, save_dir, save_idx ,save_nm):
+    def __init__(self, save_dir, save_idx ,save_nm, batch_size=32, max_batch_tokens=2048,
+                 concurrency=4, timeout=45, retries=2, client=None, cache=None,
+                 index_type="auto", nprobe=None, ef_search=None, rerank=None, lexical=True,
+                 filter_fields=("source",), reduce_dim=None, reduce="pca", backend="llama", backend_options=None,
+                 dedup=None, dedup_threshold=0.9, query_cache_size=1024, mmap_index=False, warmup=0):
         self.save_dir = save_dir
         self.save_idx = save_idx
         self.save_nm = save_nm
+        self.index_type = index_type # "auto", "flat", "hnsw", "ivf", "ivf_pq", "sq8", "fp16", "pq"
+        self.nprobe = nprobe # IVF 검색 시 탐색할 cluster 수 (None이면 저장된 값 사용)
+        self.ef_search = ef_search # HNSW 검색 시 후보 list 크기 (None이면 저장된 값 사용)
+        self.rerank = rerank # 압축 index에서 k*rerank개 후보를 원본 벡터로 재정렬 (None이면 저장된 값 사용)
+        self.lexical = lexical # BM25 index를 같이 만들어 mode="hybrid" 검색을 지원할지 여부
+        self.filter_fields = tuple(filter_fields) # metadata 중 filter 검색에 쓸 범주형 field
+        self.reduce_dim = reduce_dim # 구축 시 이 차원으로 축소 (None이면 원래 차원 그대로)
+        self.reduce = reduce # 축소 방법 "pca" 또는 "truncate"
+        if dedup not in (None, "exact", "near"):
+            raise ValueError(f"지원하지 않는 dedup : {dedup}")
+        self.dedup = dedup # _make_index 전 중복 chunk 제거 : None, "exact"(완전 중복), "near"(MinHash LSH 유사 중복 포함)
+        self.dedup_threshold = dedup_threshold # 유사 중복으로 볼 추정 Jaccard 유사도 (글자 5-gram 기준)
         self.SERVER = "HTTP://127.0.0.1:8081"
-        
+        self.MODEL = "bge-m3"
+        # 임베딩 backend (여러 db가 하나를 공유해도 된다, _embed_backends 참고)
+        # - "llama" : connection을 재사용하고 concurrency개의 요청을 동시에 보내는 llama-server client
+        # - "onnx" : 같은 프로세스에서 ONNX Runtime으로 실행 (backend_options에 model_path, tokenizer_path)
+        # - "hash" : 모델 없는 hashing 벡터 (test / benchmark용)
+        if client is None:
+            if backend == "llama":
+                options = dict(server=self.SERVER, model=self.MODEL, batch_size=batch_size,
+                               max_batch_tokens=max_batch_tokens, concurrency=concurrency, timeout=timeout,
+                               retries=retries)
+                options.update(backend_options or {})
+            else:
+                options = dict(backend_options or {})
+            client = make_embedding_backend(backend, **options)
+        self.client = client
+        self.MODEL = getattr(client, "model", self.MODEL) # 임베딩 캐시 key (backend/모델마다 다르게)
+        self.cache = cache # embedding_cache, 있으면 서버 호출 전에 먼저 찾아본다
+        # 검색 query 임베딩과 결과의 메모리 LRU 캐시 (0이면 사용 안 함), 적중률은 self.query_cache.stats()
+        self.query_cache = query_cache(4 * query_cache_size, query_cache_size) if query_cache_size else None
+        # 검색기가 index를 memory-map으로 연다 (시작이 빠르고 index 크기만큼 메모리를 미리 쓰지 않는다)
+        # 갱신은 항상 새 세대 파일에 쓰므로(_commit 참고) 열려 있는 index 파일을 교체하지 않는다
+        self.mmap_index = mmap_index
+        self.warmup = warmup # 검색기가 index를 연 직후 저장된 벡터 warmup개로 미리 검색해서 자주 쓰는 page를 올려둔다
+        self._searcher = None
+
     def _embed_text(self, texts):
         """
-        llama-server의 /v1/embeddings 엔드포인트를 사용해 bge-m3.gguf 임베딩 진행
-        반환 결과 : (N, D) float32 numpy array
+        embedding backend(기본 llama-server의 /v1/embeddings, bge-m3.gguf)로 임베딩 진행
+        반환 결과 : (N, D) float32 numpy array (i번째 행 = texts[i]의 임베딩)
         N = chunk나 sentence의 개수
         D = 각 chunk나 sentence를 vector space로 넘길 때에, vector의 차원
+        일부라도 실패하면 EmbeddingError(failed={위치: 사유}) 발생
+        cache가 있으면 캐시에 없는 텍스트만 서버로 보낸다
         """
-        out=[]
-        for t in texts:
-            vecs = None 
-            try:
-                r= requests.post(f"{self.SERVER}/v1/embeddings", json={"model": "bge-m3", "input": t}, timeout=45)
-                if r.ok and "data" in r.json():
-                    vecs= r.json()["data"][0]["embedding"]
-                    v = np.array(vecs, dtype=np.float32)
-                    v /= (np.linalg.norm(v)+1e-12) # cosine similarity를 사용하기 위해서 정규화 실시
-                    out.append(v)
-            except Exception:
-                pass
-        if vecs is None:
-            raise RuntimeError(f"embedding API 실패: {t}")
-            
-        return np.vstack(out).astype("float32")
+        if self.cache is None:
+            return self.client.embed(texts)
+
+        texts = list(texts)
+        if not texts:
+            raise ValueError("임베딩할 텍스트가 없습니다")
+        found, missing = self.cache.get_many(self.MODEL, texts)
+        if missing:
+            new_vecs = self.client.embed([texts[i] for i in missing])
+            self.cache.put_many(self.MODEL, [texts[i] for i in missing], new_vecs)
+            found.update(zip(missing, new_vecs))
+        return np.vstack([found[i] for i in range(len(texts))]).astype("float32")
     
-    def _make_index(self, texts): # idx는 "faiss_ip.index"와 같은 형식
-        text_embedded = self._embed_text(texts)
+    def _make_index(self, texts, metadatas=None): # idx는 "faiss_ip.index"와 같은 형식
+        """
+        texts로 index를 새로 만든다. metadatas[i]는 texts[i]의 metadata dict
+        (load_and_chunk_pdfs의 chunk["metadata"] 그대로, filter_fields는 filter 검색에 사용)
+        dedup이 설정되어 있으면 중복 chunk는 대표 chunk 하나만 임베딩/저장한다
+        반환 결과 : texts 순서대로의 id (중복 chunk는 대표 chunk의 id)
+        """
+        texts, metadatas, ids = self._dedup(list(texts), metadatas)
+        self._build(texts, self._embed_with_cache(texts), metadatas)
+        return ids
+
+    def _dedup(self, texts, metadatas=None):
+        """
+        중복 chunk를 대표(먼저 나온 chunk) 하나로 합친다. 중복들의 metadata는 대표 metadata의 "duplicates" list에 남긴다
+        반환 결과 : (대표 texts, 대표 metadatas, 입력 위치별 id)
+        """
+        if not self.dedup:
+            return texts, metadatas, np.arange(len(texts), dtype=np.int64)
+        canonical = find_duplicates(texts, self.dedup_threshold, near=self.dedup == "near")
+        keep = np.flatnonzero(canonical == np.arange(len(texts)))
+        new_id = np.empty(len(texts), dtype=np.int64)
+        new_id[keep] = np.arange(len(keep))
+        ids = new_id[canonical]
+        if metadatas is not None:
+            merged = [dict(metadatas[p] or {}) for p in keep]
+            for p in np.flatnonzero(canonical != np.arange(len(texts))):
+                merged[ids[p]].setdefault("duplicates", []).append(metadatas[p] or {})
+            metadatas = merged
+        print(f"dedup : {len(texts)} -> {len(keep)} chunk")
+        return [texts[p] for p in keep], metadatas, ids
+
+    def _build(self, texts, text_embedded, metadatas=None):
+        """
+        이미 임베딩된 벡터로 index를 새로 만들어 저장 (text_embedded[i] = texts[i]의 벡터)
+        모든 파일을 새 세대 이름으로 쓰고 마지막에 meta를 교체해서 전환한다 (_commit 참고)
+        """
         text_ids = np.arange(len(texts),dtype=np.int64)
 
         dim = text_embedded.shape[1]
-        base_index = faiss.IndexFlatIP(dim)
-        print("base_index 완성")
-        index = faiss.IndexIDMap2(base_index)
-        print("index map 완성")
-        index.add_with_ids(text_embedded, text_ids)
+        spec = _choose_index_spec(len(texts), dim, self.index_type, self.nprobe, self.ef_search, self.rerank,
+                                  self.reduce_dim, self.reduce)
+        index = _build_index(text_embedded, text_ids, spec)
         print("index_size : ", index.ntotal)
 
+        old = self._read_meta() if self._has_index() else None
+        gen = old.get("generation", 0) + 1 if old else 1
+        files = {"index": self._gen_name(self.save_idx, gen), "vecs": self._gen_name(self.save_idx, gen) + ".vecs",
+                 "blob": self._gen_name(self._docs_root(), gen) + ".blob",
+                 "offs": self._gen_name(self._docs_root(), gen) + ".offs", "attrs": None, "bm25": []}
+        self._write_vectors(files["vecs"], text_embedded, 0)
+        write_docstore(self._path(self._gen_name(self._docs_root(), gen)), {i: texts[i] for i in range(len(texts))})
+        if metadatas is not None:
+            self._append_attrs(files, gen, text_ids, metadatas)
+        if self.lexical:
+            files["bm25"] = [self._gen_name(self._docs_root(), gen) + ".bm25"]
+            build_bm25(self._path(files["bm25"][0]), text_ids, texts)
+        faiss.write_index(index, self._path(files["index"]))
+        meta = {"dim": int(dim), "ntotal": int(index.ntotal), "next_id": len(texts), "deleted": [], "index": spec,
+                "generation": gen}
+        self._commit(meta, files, self._files(old) if old else None)
+        print("index report : ", self.report(index, spec))
+        print("Saved : ", index.ntotal, " vectors")
+
+    def add_texts(self, texts, metadatas=None):
+        """
+        기존 index에 texts를 추가 (새 텍스트만 임베딩). 저장된 index가 없으면 _make_index로 새로 만든다
+        metadatas[i]는 texts[i]의 metadata dict
+        id는 meta의 next_id부터 차례로 발급되고, 삭제된 id는 다시 쓰지 않는다
+        반환 결과 : 발급된 id의 numpy array
+        """
+        texts = list(texts)
+        if not self._has_index():
+            return self._make_index(texts, metadatas)
+        if not texts:
+            return np.empty(0, dtype=np.int64)
 
-        faiss.write_index(index, os.path.join(self.save_dir, self.save_idx))
-        with open(os.path.join(self.save_dir, self.save_nm), "w", encoding="utf-8") as f:
-            json.dump({int(i):texts[i] for i in range(len(texts))}, f, ensure_ascii=False, indent=2)
+        vecs = self._embed_with_cache(texts)
+        index, docs, meta = self._load_for_update()
+        old_files = self._files(meta)
+        files = dict(old_files)
+        gen = meta.get("generation", 0) + 1
+        ids = np.arange(meta["next_id"], meta["next_id"] + len(texts), dtype=np.int64)
+        index.add_with_ids(vecs, ids)
+        meta["next_id"] = int(ids[-1]) + 1
+        meta["ntotal"] = int(index.ntotal)
+        meta["generation"] = gen
 
-        print("Saved : ", index.ntotal, " vectors")
+        # 벡터와 문장은 기존 파일 끝에 이어 쓰고(검색기는 meta의 next_id / offs 표까지만 읽는다),
+        # 나머지는 새 세대 파일로 쓴 뒤 meta를 교체 : 중간에 실패하면 아무것도 바뀌지 않는다
+        self._write_vectors(files["vecs"], vecs, int(ids[0]))
+        files["offs"] = self._gen_name(self._docs_root(), gen) + ".offs"
+        docs.append(ids, texts, self._path(files["offs"]))
+        if metadatas is not None:
+            self._append_attrs(files, gen, ids, metadatas)
+        if self.lexical:
+            files["bm25"] = self._append_bm25(files["bm25"], gen, docs, ids, texts, compact="files" not in meta)
+        docs.close()
+        files["index"] = self._gen_name(self.save_idx, gen)
+        faiss.write_index(index, self._path(files["index"]))
+        self._commit(meta, files, old_files)
+        print("Added : ", len(ids), " vectors, index_size : ", index.ntotal)
+        return ids
+
+    def remove_ids(self, ids):
+        """
+        ids를 index와 docs에서 삭제. HNSW, IVF처럼 IndexIDMap2 안에서 삭제할 수 없는 index는 meta의 deleted(tombstone)에 기록해서
+        검색 결과에서 제외한다 (tombstone이 많아지면 _make_index로 재구축 권장)
+        반환 결과 : 실제로 삭제된 개수
+        """
+        index, docs, meta = self._load_for_update()
+        ids = np.asarray([i for i in set(int(i) for i in ids) if i in docs], dtype=np.int64)
+        if len(ids) == 0:
+            docs.close()
+            return 0
+        if _supports_remove(index):
+            index.remove_ids(faiss.IDSelectorBatch(ids))
+        else:
+            meta["deleted"] = sorted(set(meta.get("deleted", [])) | set(ids.tolist()))
+        meta["ntotal"] = int(index.ntotal)
+        old_files = self._files(meta)
+        files = dict(old_files)
+        gen = meta.get("generation", 0) + 1
+        meta["generation"] = gen
+
+        files["offs"] = self._gen_name(self._docs_root(), gen) + ".offs"
+        docs.remove(ids, self._path(files["offs"]))
+        docs.close()
+        files["index"] = self._gen_name(self.save_idx, gen)
+        faiss.write_index(index, self._path(files["index"]))
+        self._commit(meta, files, old_files)
+        print("Removed : ", len(ids), " vectors, tombstones : ", len(meta.get("deleted", [])))
+        return len(ids)
+
+    def _embed_with_cache(self, texts):
+        vecs = self._embed_text(texts)
+        if self.cache is not None:
+            self.cache.flush()
+            print("embedding cache : ", self.cache.stats())
+        return vecs
+
+    def _load_for_update(self):
+        self._convert_legacy_docs()
+        meta = self._read_meta()
+        files = self._files(meta)
+        index = faiss.read_index(self._path(files["index"]))
+        docs = self._open_docstore(files)
+        # next_id가 없는 예전 index는 기존 id 중 최대값 다음부터 발급
+        meta.setdefault("next_id", docs.n_rows)
+        meta.setdefault("deleted", [])
+        return index, docs, meta
+
+    def _write_vectors(self, name, vecs, first_id):
+        """
+        원본 벡터 파일의 first_id 행부터 기록 (first_id=0이면 새 파일)
+        기존 파일에는 검색기가 읽는 행(meta의 next_id 미만) 뒤에만 쓰고 파일을 줄이지 않는다
+        (열려 있는 memmap 영역을 바꾸거나 잘라내면 다른 검색기가 깨진다)
+        """
+        path = self._path(name)
+        mode = "r+b" if first_id and os.path.exists(path) else "wb"
+        with open(path, mode) as f:
+            f.seek(first_id * vecs.shape[1] * 4)
+            np.ascontiguousarray(vecs, dtype=np.float32).tofile(f)
+
+    def _write_meta(self, meta):
+        _atomic_write(self._meta_path(), lambda tmp: _dump_json(meta, tmp))
+
+    def _commit(self, meta, files, old_files=None):
+        """
+        새 세대의 파일을 모두 쓴 뒤 마지막에 호출 : files를 담은 meta를 원자적으로 교체해서 한 번에 전환하고,
+        검색기가 있으면 바로 다시 읽게 한 뒤 현재 세대와 바로 이전 세대(old_files)에 속하지 않는 파일을 지운다
+        """
+        meta["files"] = files
+        self._write_meta(meta)
+        if self._searcher is not None:
+            self._searcher.reload()
+        self._remove_stale_files([files, old_files])
+
+    def _has_index(self):
+        return os.path.exists(self._meta_path()) or os.path.exists(self._path(self.save_idx))
+
+    def _drop_index(self):
+        """저장된 index를 없앤다 (meta를 먼저 지워서 전환하고, 나머지 파일은 지울 수 있는 만큼 정리)"""
+        if os.path.exists(self._meta_path()):
+            os.remove(self._meta_path())
+        self._searcher = None
+        self._remove_stale_files([])
+
+    def _path(self, name):
+        return os.path.join(self.save_dir, name)
+
+    def _docs_root(self):
+        """문장 저장소 이름 (예: save_nm="faiss_docs.json" -> faiss_docs)"""
+        return os.path.splitext(self.save_nm)[0]
+
+    def _docs_base(self):
+        """예전 형식의 문장 저장소 경로 (예: faiss_docs.blob / faiss_docs.offs)"""
+        return self._path(self._docs_root())
+
+    @staticmethod
+    def _gen_name(name, gen):
+        """세대별 파일 이름 (예: faiss_ip.index -> faiss_ip.3.index, faiss_docs -> faiss_docs.3)"""
+        root, ext = os.path.splitext(name)
+        return f"{root}.{gen}{ext}"
+
+    def _legacy_files(self):
+        """meta에 files가 없는 예전 형식(고정된 이름을 제자리에서 고치던 방식)의 파일 이름"""
+        docs = self._docs_root()
+        return {"index": self.save_idx, "vecs": self.save_idx + ".vecs", "blob": docs + ".blob", "offs": docs + ".offs",
+                "attrs": [docs + ".attrs", None] if os.path.isdir(self._path(docs + ".attrs")) else None,
+                "bm25": [docs + ".bm25"] if os.path.isdir(self._path(docs + ".bm25")) else []}
+
+    def _files(self, meta):
+        """
+        meta가 가리키는 현재 세대의 파일 이름 (save_dir 기준)
+        {"index", "vecs", "blob", "offs", "attrs": [디렉토리, version] 또는 None, "bm25": [디렉토리, ...]}
+        """
+        return meta.get("files") or self._legacy_files()
+
+    def _file_names(self, files):
+        names = {files["index"], files["vecs"], files["blob"], files["offs"], *files["bm25"]}
+        if files["attrs"]:
+            names.add(files["attrs"][0])
+        return names
+
+    def _remove_stale_files(self, keep):
+        """
+        keep(files들)에 없는 세대 파일과 예전 형식의 파일을 지운다
+        다른 검색기가 아직 열어둔 파일(Windows)은 지워지지 않으므로 다음 기록 때 다시 시도한다
+        """
+        keep = [files for files in keep if files]
+        names = set().union(*(self._file_names(files) for files in keep))
+        pattern = re.compile(rf"^(?:{re.escape(os.path.splitext(self.save_idx)[0])}|{re.escape(self._docs_root())})\.\d+(?:\.|$)")
+        legacy = self._file_names(self._legacy_files())
+        for name in os.listdir(self.save_dir):
+            if name in names or not (pattern.match(name) or name in legacy):
+                continue
+            path = self._path(name)
+            try:
+                shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+            except OSError:
+                pass
+        # 같은 attrs 디렉토리 안에서는 version별 파일로 구분한다
+        attrs = [files["attrs"] for files in keep if files["attrs"]]
+        if attrs and os.path.isdir(self._path(attrs[0][0])):
+            remove_attribute_versions(self._path(attrs[0][0]), {v for name, v in attrs if name == attrs[0][0]})
+
+    def _append_attrs(self, files, gen, ids, metadatas):
+        """metadata를 gen version 파일로 기록 (attrs가 아직 없으면 새 디렉토리)"""
+        name, version = files["attrs"] or (self._gen_name(self._docs_root(), gen) + ".attrs", gen)
+        if files["attrs"] is None:
+            shutil.rmtree(self._path(name), ignore_errors=True) # 이전에 실패한 같은 세대의 흔적
+        attrs = attribute_store(self._path(name), self.filter_fields, version)
+        attrs.append(ids, metadatas, gen)
+        attrs.close()
+        files["attrs"] = [name, gen]
+
+    def _append_bm25(self, segments, gen, docs, ids, texts, compact=False):
+        """
+        (ids, texts)를 BM25에 추가한 segment 목록. 새 chunk만으로 segment를 하나 만들어 붙이고,
+        segment가 BM25_MAX_SEGMENTS개에 이르거나 compact(예전 형식 : 기존 BM25가 최신이 아닐 수 있다)면
+        docs의 모든 chunk로 하나를 다시 만든다 (삭제된 chunk도 이때 빠진다)
+        """
+        path = self._path(self._gen_name(self._docs_root(), gen) + ".bm25")
+        if compact or not segments or len(segments) + 1 >= BM25_MAX_SEGMENTS:
+            live = docs.live_ids()
+            build_bm25(path, live, [docs[int(i)] for i in live])
+            return [os.path.basename(path)]
+        build_bm25(path, ids, texts)
+        return segments + [os.path.basename(path)]
+
+    def _convert_legacy_docs(self):
+        """예전 JSON sidecar만 있으면 binary 저장소로 변환 (meta에 files가 없는 예전 형식만)"""
+        base = self._docs_base()
+        legacy = self._path(self.save_nm)
+        if ("files" not in self._read_meta() and not os.path.exists(base + ".offs")
+                and legacy.endswith(".json") and os.path.exists(legacy)):
+            convert_json_docstore(legacy, base)
+
+    def _open_docstore(self, files):
+        """binary 문장 저장소를 연다"""
+        return mmap_docstore(self._path(files["blob"][:-len(".blob")]), self._path(files["offs"]))
     
-    def _search_db(self, q, k):
-        index = faiss.read_index(os.path.join(self.save_dir, self.save_idx))
-        with open(os.path.join(self.save_dir,self.save_nm),"r", encoding="utf-8") as f:
-            DOCS = {int(k): v for k, v in json.load(f).items()}
-
-            print("loaded_index size : ", index.ntotal)
-
-            # Test
-            query = q
-            q_emb = self._embed_text([query])
-            print("임베딩 된 쿼리 : ",q_emb)
-            D, I = index.search(q_emb.astype("float32"), k)
-            print(f'--- search results : [선택된 {k}개의 Distance[유사도] : {D}"], [선택된 n개의 Index[문장번호] : {I}"] ---' )
-
-            search_result = []
-            for idx, score in zip(I[0], D[0]):
-                if idx == -1:
-                    continue
-                search_result.append((DOCS[idx], float(score)))
-            print(search_result)
-        return search_result
+    def _search_db(self, q, k, mode="dense", filters=None, with_metadata=False, mmr_lambda=None):
+        """
+        q와 가장 유사한 k개의 (문장, 유사도) list 반환
+        index와 docs는 faiss_searcher가 한 번만 읽어두고, 파일이 바뀌면 알아서 다시 읽는다
+        mode="hybrid"면 벡터 검색과 BM25 검색 결과를 RRF로 합친다 (유사도 자리에 RRF 점수)
+        filters={"source": "회의록.pdf"} 처럼 주면 해당 metadata를 가진 chunk 안에서만 검색
+        with_metadata=True면 (문장, 유사도, metadata) 반환
+        mmr_lambda(0~1)를 주면 k*4개의 후보 중 서로 겹치지 않는 k개를 MMR로 고른다 (1이면 유사도 순서 그대로)
+        """
+        return self._get_searcher().search(q, k, mode, filters, with_metadata, mmr_lambda)
+
+    def search_many(self, queries, k, mode="dense", filters=None, with_metadata=False, mmr_lambda=None):
+        """
+        여러 query를 한 번에 임베딩하고 index.search도 (len(queries), D) 행렬로 한 번만 호출
+        반환 결과 : queries[i]에 대한 [(문장, 유사도), ...] list들의 list
+        """
+        return self._get_searcher().search_many(queries, k, mode, filters, with_metadata, mmr_lambda)
+
+    def _open_attrs(self, files):
+        """metadata 저장소 (files["attrs"] = [디렉토리, version]), 없으면 None"""
+        if files["attrs"] is None or not os.path.isdir(self._path(files["attrs"][0])):
+            return None
+        return attribute_store(self._path(files["attrs"][0]), self.filter_fields, files["attrs"][1])
+
+    def _open_bm25(self, meta):
+        """
+        meta가 가리키는 BM25 segment들을 연다 (없으면 None : hybrid 검색 불가)
+        BM25는 기록하는 쪽(_build, add_texts)만 만들고 고친다. 검색기는 파일을 쓰지 않는다
+        """
+        segments = self._files(meta)["bm25"]
+        return bm25_segments([self._path(name) for name in segments]) if segments else None
+
+    def _meta_path(self):
+        """index 종류/parameter를 기록하는 파일 (예: faiss_ip.index.meta.json)"""
+        return os.path.join(self.save_dir, self.save_idx + ".meta.json")
+
+    def _load_vectors(self, dim, meta):
+        """
+        정규화된 원본 float32 벡터(예: faiss_ip.3.index.vecs, i번째 행 = id i)를 memmap으로 연다 (읽은 page만 메모리에 올라간다)
+        meta의 next_id까지만 연다 (그 뒤는 아직 전환되지 않은 add_texts가 이어 쓰는 중일 수 있다). 파일이 없으면 None
+        """
+        path = self._path(self._files(meta)["vecs"])
+        if not os.path.exists(path):
+            return None
+        rows = os.path.getsize(path) // (dim * 4)
+        if "next_id" in meta:
+            rows = min(rows, meta["next_id"])
+        return np.memmap(path, dtype=np.float32, mode="r", shape=(rows, dim)) if rows else None
+
+    def report(self, index=None, spec=None, k=10):
+        """
+        저장된 index의 메모리 사용량과 원래 차원 flat(brute force) 대비 recall@k
+        반환 결과 : {"type", "ntotal", "dim", "index_dim", "index_bytes", "bytes_per_vector", "flat_bytes", f"recall@{k}"}
+        """
+        meta = self._load_meta()
+        spec = spec or meta["index"]
+        index_path = self._path(self._files(meta)["index"])
+        if index is None:
+            index = faiss.read_index(index_path)
+        _apply_search_params(index, spec)
+        index_bytes = os.path.getsize(index_path)
+        out = {
+            "type": spec["type"],
+            "ntotal": int(index.ntotal),
+            "dim": int(index.d),
+            "index_dim": int(spec.get("reduce_dim", index.d)),
+            "index_bytes": index_bytes,
+            "bytes_per_vector": index_bytes / max(1, index.ntotal),
+            "flat_bytes": int(index.ntotal) * index.d * 4,
+        }
+        vectors = self._load_vectors(index.d, meta)
+        if spec["type"] == "flat" and "reduce" not in spec:
+            out[f"recall@{k}"] = 1.0
+        elif vectors is not None:
+            out[f"recall@{k}"] = _recall_at_k(index, vectors, spec, k)
+        return out
+
+    def _read_meta(self):
+        """저장된 meta. meta가 없는 예전 index는 flat"""
+        if not os.path.exists(self._meta_path()):
+            return {"index": {"type": "flat"}}
+        with open(self._meta_path(), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _load_meta(self):
+        """저장된 meta를 읽고, 생성자에서 지정한 nprobe/ef_search가 있으면 덮어쓴다 (검색용)"""
+        meta = self._read_meta()
+        spec = meta["index"]
+        if self.nprobe is not None and "nprobe" in spec:
+            spec["nprobe"] = self.nprobe
+        if self.ef_search is not None and "efSearch" in spec:
+            spec["efSearch"] = self.ef_search
+        if self.rerank is not None and spec["type"] != "flat":
+            spec["rerank"] = int(self.rerank)
+        return meta
+
+    def startup_report(self):
+        """검색기를 여는 데 걸린 시간 (load_ms, warmup_ms, first_query_ms = 생성부터 첫 검색 결과까지)"""
+        return dict(self._get_searcher().startup)
+
+    def _get_searcher(self):
+        if self._searcher is None:
+            self._searcher = faiss_searcher(self)
+        return self._searcher
+
+
+_index_snapshot = namedtuple("_index_snapshot", ["stamp", "index", "docs", "meta", "vectors", "bm25", "attrs"])
+
+
+class faiss_searcher:
+    """
+    index와 docs를 한 번만 읽어서 메모리에 두고 여러 query를 처리하는 검색기
+    check_interval초마다 파일의 (mtime, size)를 확인하고, 바뀌었으면 background thread에서 새 index를 읽어
+    snapshot 참조 하나만 교체한다. 진행 중인 검색은 자기가 잡은 이전 snapshot으로 끝까지 수행된다.
+    """
+    def __init__(self, db, check_interval=1.0):
+        self.db = db
+        self.check_interval = check_interval
+        self._reload_lock = threading.Lock()
+        self._last_check = time.monotonic()
+        self._created = time.perf_counter()
+        self.db._convert_legacy_docs() # 예전 JSON sidecar면 stamp를 찍기 전에 변환
+        self._snapshot = self._load(self._stamp())
+        self.startup = {"mmap": bool(db.mmap_index), "load_ms": (time.perf_counter() - self._created) * 1000,
+                        "warmup_ms": 0.0, "first_query_ms": None}
+        if db.warmup:
+            t0 = time.perf_counter()
+            self._warm_up(self._snapshot, db.warmup)
+            self.startup["warmup_ms"] = (time.perf_counter() - t0) * 1000
+
+    def _paths(self):
+        """
+        바뀌었는지 확인할 파일 : meta(새 세대로 전환할 때 마지막에 교체된다)
+        + meta에 files가 없는 예전 형식이 제자리에서 고치던 index와 docs 표
+        """
+        legacy = self.db._legacy_files()
+        return (self.db._meta_path(), self.db._path(legacy["index"]), self.db._path(legacy["offs"]))
+
+    def _stamp(self):
+        stamp = []
+        for p in self._paths():
+            try:
+                st = os.stat(p)
+            except FileNotFoundError:
+                stamp.append(None)
+                continue
+            stamp.append((st.st_ino, st.st_mtime_ns, st.st_size))
+        return tuple(stamp)
+
+    def _load(self, stamp):
+        meta = self.db._load_meta()
+        files = self.db._files(meta)
+        index = _read_index(self.db._path(files["index"]), meta["index"], self.db.mmap_index)
+        _apply_search_params(index, meta["index"])
+        docs = self.db._open_docstore(files)
+        vectors = self.db._load_vectors(index.d, meta) # rerank / MMR용 원본 벡터 (memmap)
+        bm25 = self.db._open_bm25(meta) if self.db.lexical else None
+        attrs = self.db._open_attrs(files)
+        print("loaded_index size : ", index.ntotal, meta["index"])
+        return _index_snapshot(stamp, index, docs, meta, vectors, bm25, attrs)
+
+    def _warm_up(self, snap, n_queries, k=10):
+        """
+        저장된 벡터 중 n_queries개를 고르게 뽑아 검색해서, 실제 검색이 지나가는 inverted list / graph / code page를
+        미리 메모리에 올린다 (mmap으로 연 index의 첫 query 지연을 줄인다)
+        """
+        if snap.vectors is None or len(snap.vectors) == 0:
+            return
+        ids = np.linspace(0, len(snap.vectors) - 1, min(n_queries, len(snap.vectors))).astype(np.int64)
+        _search_vectors(snap.index, np.asarray(snap.vectors[ids], dtype=np.float32), k, snap.meta["index"])
+
+    def _reload_if_changed(self):
+        try:
+            stamp = self._stamp()
+            if stamp != self._snapshot.stamp:
+                self._snapshot = self._load(stamp)
+        except Exception as e:
+            # 저장 도중이라 파일이 불완전할 수 있다 -> 기존 index를 계속 사용하고 다음 확인 때 다시 시도
+            print("index reload 실패, 기존 index 유지 : ", e)
+        finally:
+            self._reload_lock.release()
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        if self._reload_lock.acquire(blocking=False):
+            threading.Thread(target=self._reload_if_changed, daemon=True).start()
+
+    def reload(self):
+        """파일 변경 여부를 바로 확인하고 바뀌었으면 다시 읽는다 (완료될 때까지 대기)"""
+        self._reload_lock.acquire()
+        self._reload_if_changed()
+
+    def _current(self):
+        """검색에 쓸 snapshot (필요하면 background reload를 시작한다)"""
+        self._maybe_reload()
+        return self._snapshot
+
+    def search(self, q, k, mode="dense", filters=None, with_metadata=False, mmr_lambda=None):
+        return self.search_many([q], k, mode, filters, with_metadata, mmr_lambda)[0]
+
+    def search_many(self, queries, k, mode="dense", filters=None, with_metadata=False, mmr_lambda=None,
+                    hybrid_fetch=4, mmr_fetch=4):
+        """
+        mode="dense" : 벡터 검색
+        mode="hybrid" : 벡터 검색과 BM25 검색에서 각각 k*hybrid_fetch개를 뽑아 RRF로 합친 top-k
+        filters : {field: 값 또는 값 list}, 조건을 만족하는 chunk 안에서만 검색
+        mmr_lambda : 주면 k*mmr_fetch개의 후보에서 MMR로 다양한 k개를 고른다
+        db.query_cache가 있으면 같은 (query, k, mode, filters, ...)의 결과를 재사용한다 (index가 바뀌면 결과 캐시는 비워진다)
+        """
+        queries = list(queries)
+        if not queries:
+            return []
+        if mode not in ("dense", "hybrid"):
+            raise ValueError(f"지원하지 않는 mode : {mode}")
+
+        snap = self._current()
+        options = (mode, filters, with_metadata, mmr_lambda, hybrid_fetch, mmr_fetch)
+        cache = self.db.query_cache
+        if cache is None:
+            return self._search_queries(snap, queries, k, *options)
+
+        keys = [cache.result_key(q, k, mode, filters, with_metadata, mmr_lambda, hybrid_fetch, mmr_fetch)
+                for q in queries]
+        results = [cache.get_result(snap.stamp, key) for key in keys]
+        missing = [i for i, r in enumerate(results) if r is None]
+        if missing:
+            fresh = self._search_queries(snap, [queries[i] for i in missing], k, *options)
+            for i, r in zip(missing, fresh):
+                results[i] = r
+                cache.put_result(snap.stamp, keys[i], copy.deepcopy(r) if with_metadata else r)
+        # metadata dict는 호출한 쪽이 고칠 수 있으므로 캐시에 든 것과 따로 돌려준다
+        return [copy.deepcopy(r) if with_metadata else list(r) for r in results]
+
+    def _embed_queries(self, queries):
+        """
+        query 임베딩 (db.query_cache에 있는 query는 다시 임베딩하지 않는다)
+        corpus용 디스크 임베딩 캐시(db.cache)는 거치지 않는다 (query가 corpus 벡터를 LRU에서 밀어내지 않도록)
+        """
+        cache = self.db.query_cache
+        if cache is None:
+            return self.db.client.embed(queries)
+        found, missing = cache.get_embeddings(self.db.MODEL, queries)
+        if missing:
+            new_vecs = self.db.client.embed([queries[i] for i in missing])
+            cache.put_embeddings(self.db.MODEL, [queries[i] for i in missing], new_vecs)
+            found.update(zip(missing, new_vecs))
+        return np.vstack([found[i] for i in range(len(queries))]).astype("float32")
+
+    def _search_queries(self, snap, queries, k, mode, filters, with_metadata, mmr_lambda, hybrid_fetch, mmr_fetch):
+        allowed = self._filter_bitmap(snap, filters)
+        q_emb = self._embed_queries(queries)
+        final_k = k
+        if mmr_lambda is not None:
+            k = k * mmr_fetch
+        if mode == "dense":
+            hits = [[(i, score) for i, _, score in row] for row in self._search_embedded(q_emb, k, snap, allowed)]
+        else:
+            if snap.bm25 is None:
+                raise ValueError("BM25 index가 없습니다 : hybrid 검색은 lexical=True로 index를 만들거나 add_texts한 뒤에 가능합니다")
+            dense = self._search_embedded(q_emb, k * hybrid_fetch, snap, allowed)
+            hits = []
+            for q, dense_hits in zip(queries, dense):
+                lexical_ids = [i for i, _ in snap.bm25.search(q, k * hybrid_fetch + len(snap.meta.get("deleted", [])))
+                               if i in snap.docs and (allowed is None or _in_bitmap(allowed, i))]
+                hits.append(reciprocal_rank_fusion([[i for i, _, _ in dense_hits], lexical_ids], k))
+        if mmr_lambda is not None:
+            hits = [self._diversify(snap, q, row, final_k, mmr_lambda) for q, row in zip(q_emb, hits)]
+
+        if self.startup["first_query_ms"] is None:
+            self.startup["first_query_ms"] = (time.perf_counter() - self._created) * 1000
+        if with_metadata:
+            return [[(snap.docs[i], score, snap.attrs.get(i) if snap.attrs else {}) for i, score in row] for row in hits]
+        return [[(snap.docs[i], score) for i, score in row] for row in hits]
+
+    def _diversify(self, snap, q, row, k, lam):
+        """후보 [(id, 점수), ...] 중 MMR로 k개 선택 (점수는 원래 점수 유지)"""
+        if len(row) <= 1:
+            return row[:k]
+        ids = np.asarray([i for i, _ in row], dtype=np.int64)
+        if snap.vectors is not None:
+            order = np.argsort(ids) # memmap은 정렬된 순서로 읽는 편이 빠르다
+            cand = np.empty((len(ids), snap.vectors.shape[1]), dtype=np.float32)
+            cand[order] = snap.vectors[ids[order]]
+        else:
+            cand = snap.index.reconstruct_batch(ids)
+        return [row[j] for j in _mmr(q, cand, k, lam)]
+
+    def _filter_bitmap(self, snap, filters):
+        if not filters:
+            return None
+        if snap.attrs is None:
+            raise ValueError("metadata 없이 만든 index는 filter 검색을 할 수 없습니다")
+        return snap.attrs.bitmap(filters, snap.docs.n_rows)
+
+    def _search_embedded(self, q_emb, k, snap=None, allowed=None):
+        """
+        이미 임베딩된 query 행렬로 검색. allowed가 있으면 그 bitmap에 속한 id만 검색
+        반환 결과 : query별 [(id, 문장, 유사도), ...] list들의 list
+        """
+        if snap is None:
+            snap = self._current()
+        spec = snap.meta["index"]
+        want = k
+        if allowed is not None:
+            n_allowed = int(np.unpackbits(allowed).sum())
+            if n_allowed <= EXACT_FILTER_MAX and snap.vectors is not None:
+                ids = np.flatnonzero(np.unpackbits(allowed, bitorder="little"))
+                ids = np.asarray([i for i in ids.tolist() if i in snap.docs and i < len(snap.vectors)], dtype=np.int64)
+                D, I = _exact_filtered(q_emb, snap.vectors, ids, k)
+                return [[(int(idx), snap.docs[int(idx)], float(score)) for idx, score in zip(row_ids, row_scores) if idx != -1]
+                        for row_ids, row_scores in zip(I, D)]
+            want = min(k, n_allowed)
+        # tombstone(삭제됐지만 index에 남아있는 id)이 결과에 섞여도 k개가 남도록 그만큼 더 가져온다
+        fetch = k + len(snap.meta.get("deleted", []))
+        params = None
+        if allowed is not None and _supports_selector(spec):
+            params = _selector_params(spec, allowed)
+        post_filter = allowed is not None and params is None
+
+        while True:
+            D, I = _search_vectors(snap.index, q_emb, fetch, spec, snap.vectors, params)
+            results = []
+            for ids, scores in zip(I, D):
+                hits = [(int(idx), snap.docs[int(idx)], float(score)) for idx, score in zip(ids, scores)
+                        if int(idx) in snap.docs and (not post_filter or _in_bitmap(allowed, int(idx)))]
+                results.append(hits[:k])
+            if all(len(r) >= want for r in results):
+                return results
+            # 조건에 맞는 결과가 k개 모일 때까지 후보 수와 탐색 범위(nprobe, efSearch)를 늘린다
+            # (selector를 못 쓰는 PQ는 후보 수만 늘려서 검색 후에 거른다)
+            wider = _widen_search(spec, snap.index.ntotal) if params is not None else None
+            if fetch >= snap.index.ntotal and wider is None:
+                return results
+            fetch *= 4
+            if wider is not None:
+                spec = wider
+                params = _selector_params(spec, allowed)
    
 
 
@@ -119,4 +1065,4 @@ class faiss_vector_db:
 #     if idx == -1:
 #         continue
 #     search_result.append((sentences[idx], float(score)))
-# print(search_result)
\ No newline at end of file
+# print(search_result)
\ No newline at end of file
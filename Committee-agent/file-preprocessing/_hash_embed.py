@@ -0,0 +1,42 @@
+import hashlib
+import unicodedata
+from functools import lru_cache
+
+import numpy as np
+
+# 모델 없이 만드는 결정적(deterministic) 임베딩 (hashing trick)
+# - 텍스트를 단어 + 음절 bigram token으로 자르고, token hash로 차원 번호와 부호(+1/-1)를 정해 더한 뒤 L2 정규화
+# - 같은 텍스트는 항상 같은 벡터, token이 많이 겹치는 텍스트끼리는 내적이 크다 -> benchmark/test에서 recall 측정 가능
+# - 의미(semantic) 유사도는 반영하지 않으므로 검색 품질 평가용이 아니라 속도/동작 확인용
+
+
+def _tokens(text):
+    words = unicodedata.normalize("NFC", text).lower().split()
+    tokens = list(words)
+    for w in words:
+        tokens.extend(w[i:i + 2] for i in range(len(w) - 1))
+    return tokens or [""]
+
+
+@lru_cache(maxsize=1 << 20)
+def _token_hash(token):
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def hash_embed(texts, dim=1024):
+    """
+    반환 결과 : (N, dim) float32 numpy array (i번째 행 = texts[i]의 정규화된 hashing 벡터)
+    """
+    texts = list(texts)
+    rows, cols, signs = [], [], []
+    for row, text in enumerate(texts):
+        for token in _tokens(text):
+            h = _token_hash(token)
+            rows.append(row)
+            cols.append(h % dim)
+            signs.append(1.0 if (h >> 63) else -1.0)
+    out = np.zeros((len(texts), dim), dtype=np.float32)
+    np.add.at(out, (np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64)),
+              np.asarray(signs, dtype=np.float32))
+    out /= (np.linalg.norm(out, axis=1, keepdims=True) + 1e-12)
+    return out
@@ -0,0 +1,110 @@
+import threading
+import unicodedata
+from collections import OrderedDict
+
+# 검색 query 캐시 (메모리, LRU)
+# - query 임베딩 : key = (model, 정규화된 query). index가 바뀌어도 그대로 쓸 수 있다
+# - 최종 결과 : key = (정규화된 query, k, mode, filters, ...). index version(searcher snapshot의 stamp)이 바뀌면 전부 비운다
+# - 반복되는 질문은 임베딩 호출과 index 검색 없이 dict 조회 한 번으로 끝난다
+
+
+def _normalize(text):
+    """유니코드 NFC 정규화 + 공백 정리"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def _freeze_filters(filters):
+    """filters dict를 hash 가능한 key로 (값 list의 순서는 무시)"""
+    if not filters:
+        return ()
+    frozen = []
+    for field, wanted in sorted(filters.items()):
+        wanted = [wanted] if isinstance(wanted, (str, int)) else list(wanted)
+        frozen.append((field, tuple(sorted(str(v) for v in wanted))))
+    return tuple(frozen)
+
+
+class _lru:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self.items.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.items[key] = value
+        self.items.move_to_end(key)
+        while len(self.items) > self.max_entries:
+            self.items.popitem(last=False)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"entries": len(self.items), "capacity": self.max_entries, "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0}
+
+
+class query_cache:
+    def __init__(self, max_embeddings=4096, max_results=1024):
+        self._lock = threading.Lock()
+        self._embeddings = _lru(max_embeddings)
+        self._results = _lru(max_results)
+        self.version = None
+        self.invalidations = 0
+
+    def get_embeddings(self, model, queries):
+        """
+        반환 결과 : (found, missing)
+        found = {입력 위치: 벡터}, missing = 캐시에 없는 입력 위치 list
+        """
+        found, missing = {}, []
+        with self._lock:
+            for pos, q in enumerate(queries):
+                vec = self._embeddings.get((model, _normalize(q)))
+                if vec is None:
+                    missing.append(pos)
+                else:
+                    found[pos] = vec
+        return found, missing
+
+    def put_embeddings(self, model, queries, vecs):
+        with self._lock:
+            for q, v in zip(queries, vecs):
+                self._embeddings.put((model, _normalize(q)), v)
+
+    def result_key(self, query, k, mode="dense", filters=None, *options):
+        return (_normalize(query), k, mode, _freeze_filters(filters)) + options
+
+    def get_result(self, version, key):
+        """version(index stamp)이 캐시의 version과 다르면 결과 캐시를 비우고 None"""
+        with self._lock:
+            if version != self.version:
+                self._check_version(version)
+                self._results.misses += 1
+                return None
+            return self._results.get(key)
+
+    def put_result(self, version, key, result):
+        with self._lock:
+            self._check_version(version)
+            self._results.put(key, result)
+
+    def _check_version(self, version):
+        if version != self.version:
+            if self.version is not None:
+                self.invalidations += 1
+            self._results.items.clear()
+            self.version = version
+
+    def stats(self):
+        with self._lock:
+            return {"embeddings": self._embeddings.stats(), "results": self._results.stats(),
+                    "invalidations": self.invalidations}
@@ -0,0 +1,140 @@
+import hashlib
+import heapq
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from _faiss import faiss_vector_db
+
+# 여러 개의 faiss_vector_db(shard)로 나눠 저장하고 병렬로 검색하는 index
+# - shard i는 save_dir/shard_{i:03d}/ 에 독립된 index, meta, docstore를 가진다
+# - 전역 id = shard 내부 id * n_shards + shard 번호 (중앙 id 표 없이 shard와 내부 id를 복원할 수 있다)
+# - shard_by="hash" : 텍스트 hash로 고르게 분배 / "document" : keys(예: 파일명)가 같은 chunk는 같은 shard로
+# - 검색은 query를 한 번만 임베딩한 뒤 shard별로 thread에서 검색하고, shard별 top-k를 heap으로 합친다
+# - shard 하나만 다시 만들거나(rebuild_shard) 다시 읽을(reload_shard) 수 있다
+
+
+def _stable_hash(key):
+    return int.from_bytes(hashlib.blake2b(str(key).encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class sharded_faiss_db:
+    def __init__(self, save_dir, n_shards, save_idx="faiss_ip.index", save_nm="faiss_docs.json",
+                 shard_by="hash", max_workers=None, **db_kwargs):
+        if shard_by not in ("hash", "document"):
+            raise ValueError(f"지원하지 않는 shard_by : {shard_by}")
+        self.save_dir = save_dir
+        self.n_shards = n_shards
+        self.shard_by = shard_by
+        first = None
+        self.shards = []
+        for i in range(n_shards):
+            shard_dir = os.path.join(save_dir, f"shard_{i:03d}")
+            os.makedirs(shard_dir, exist_ok=True)
+            # 임베딩 client와 cache는 모든 shard가 공유
+            kwargs = dict(db_kwargs, client=first.client, cache=first.cache) if first else db_kwargs
+            db = faiss_vector_db(shard_dir, save_idx, save_nm, **kwargs)
+            first = first or db
+            self.shards.append(db)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers or n_shards, thread_name_prefix="shard")
+
+    def _shard_of(self, texts, keys):
+        if self.shard_by == "document":
+            if keys is None:
+                raise ValueError("shard_by='document'이면 keys(예: 문서 파일명)가 필요합니다")
+            return np.asarray([_stable_hash(k) % self.n_shards for k in keys], dtype=np.int64)
+        return np.asarray([_stable_hash(t) % self.n_shards for t in texts], dtype=np.int64)
+
+    def _to_global(self, shard_no, local_ids):
+        return np.asarray(local_ids, dtype=np.int64) * self.n_shards + shard_no
+
+    def _has_index(self, db):
+        return db._has_index()
+
+    def _make_index(self, texts, keys=None, metadatas=None):
+        """
+        전체 texts를 한 번에 임베딩한 뒤 shard별로 나눠 병렬로 index 생성
+        metadatas[i]는 texts[i]의 metadata dict (filter 검색용)
+        dedup이 설정되어 있으면 shard로 나누기 전에 전체에서 중복 chunk를 합친다
+        반환 결과 : texts 순서대로의 전역 id (중복 chunk는 대표 chunk의 id)
+        """
+        texts, metadatas, dedup_ids = self.shards[0]._dedup(list(texts), metadatas)
+        if keys is not None:
+            keys = [keys[p] for p in np.unique(dedup_ids, return_index=True)[1]]
+        vecs = self.shards[0]._embed_with_cache(texts)
+        owner = self._shard_of(texts, keys)
+        global_ids = np.empty(len(texts), dtype=np.int64)
+        jobs = []
+        for i, db in enumerate(self.shards):
+            pos = np.flatnonzero(owner == i)
+            global_ids[pos] = self._to_global(i, np.arange(len(pos)))
+            if len(pos):
+                metas = [metadatas[p] for p in pos] if metadatas is not None else None
+                jobs.append(self._pool.submit(db._build, [texts[p] for p in pos], vecs[pos], metas))
+            elif self._has_index(db):
+                db._drop_index() # 이번 구축에서 비게 된 shard
+        for job in jobs:
+            job.result()
+        return global_ids[dedup_ids]
+
+    def add_texts(self, texts, keys=None, metadatas=None):
+        """texts를 담당 shard에 추가. 반환 결과 : texts 순서대로의 전역 id"""
+        texts = list(texts)
+        owner = self._shard_of(texts, keys)
+        global_ids = np.empty(len(texts), dtype=np.int64)
+        for i, db in enumerate(self.shards):
+            pos = np.flatnonzero(owner == i)
+            if len(pos):
+                metas = [metadatas[p] for p in pos] if metadatas is not None else None
+                global_ids[pos] = self._to_global(i, db.add_texts([texts[p] for p in pos], metas))
+        return global_ids
+
+    def remove_ids(self, global_ids):
+        global_ids = np.asarray(global_ids, dtype=np.int64)
+        removed = 0
+        for i, db in enumerate(self.shards):
+            local = global_ids[global_ids % self.n_shards == i] // self.n_shards
+            if len(local) and self._has_index(db):
+                removed += db.remove_ids(local)
+        return removed
+
+    def rebuild_shard(self, shard_no, texts, metadatas=None):
+        """
+        shard 하나만 texts로 새로 만든다. metadatas[i]는 texts[i]의 metadata dict (filter 검색용)
+        반환 결과 : texts 순서대로의 전역 id (dedup이면 중복 chunk는 대표 chunk의 id)
+        """
+        local_ids = self.shards[shard_no]._make_index(list(texts), metadatas)
+        return self._to_global(shard_no, local_ids)
+
+    def reload_shard(self, shard_no):
+        """디스크에서 바뀐 shard 하나만 다시 읽는다 (다른 shard는 그대로)"""
+        self.shards[shard_no]._get_searcher().reload()
+
+    def search_many(self, queries, k, filters=None):
+        """
+        query를 한 번만 임베딩하고 모든 shard를 병렬로 검색한 뒤 shard별 top-k를 합쳐 전체 top-k를 만든다
+        filters는 faiss_vector_db.search_many와 같다 (shard마다 자기 bitmap으로 거른다)
+        반환 결과 : query별 [(문장, 유사도), ...]
+        """
+        queries = list(queries)
+        if not queries:
+            return []
+        q_emb = self.shards[0].client.embed(queries) # query는 corpus 임베딩 캐시를 거치지 않는다
+        live = [db for db in self.shards if self._has_index(db)]
+        futures = [self._pool.submit(self._search_shard, db, q_emb, k, filters) for db in live]
+        per_shard = [f.result() for f in futures]
+
+        results = []
+        for qi in range(len(queries)):
+            merged = heapq.nlargest(k, (hit for hits in per_shard for hit in hits[qi]), key=lambda h: h[2])
+            results.append([(text, score) for _, text, score in merged])
+        return results
+
+    def _search_shard(self, db, q_emb, k, filters):
+        searcher = db._get_searcher()
+        snap = searcher._current()
+        return searcher._search_embedded(q_emb, k, snap, searcher._filter_bitmap(snap, filters))
+
+    def _search_db(self, q, k, filters=None):
+        return self.search_many([q], k, filters)[0]
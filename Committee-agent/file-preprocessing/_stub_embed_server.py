@@ -0,0 +1,83 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from _hash_embed import hash_embed
+
+# llama-server 대신 띄우는 OpenAI 호환 /v1/embeddings 서버 (benchmark / 동작 확인용)
+# - 벡터는 _hash_embed.hash_embed (결정적 hashing 벡터)
+# - latency = 요청당 고정 지연 + 텍스트당 지연 (초), 실제 서버의 처리 시간을 흉내낸다
+# - /tokenize : 글자 1개 = token 1개로 계산, max_tokens보다 긴 입력은 llama-server처럼 HTTP 500
+# 실행 : python _stub_embed_server.py --port 8081 --dim 1024 --latency 0.01 --per-item-latency 0.002
+
+
+class _handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True # header와 body를 따로 보낼 때 keep-alive 연결에서 ~40ms 지연되지 않도록
+    dim = 1024
+    latency = 0.0
+    per_item_latency = 0.0
+    max_tokens = None
+    model = "bge-m3"
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path == "/tokenize":
+            return self._reply(200, {"tokens": list(range(len(body.get("content", ""))))})
+        if self.path != "/v1/embeddings":
+            return self._reply(404, {"error": f"unknown path {self.path}"})
+        inputs = body.get("input")
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        if not inputs:
+            return self._reply(400, {"error": "input is empty"})
+        if self.max_tokens and any(len(t) + 2 > self.max_tokens for t in inputs):
+            return self._reply(500, {"error": "input is too large to process. increase the physical batch size"})
+        time.sleep(self.latency + self.per_item_latency * len(inputs))
+        vecs = hash_embed(inputs, self.dim)
+        data = [{"object": "embedding", "index": i, "embedding": v.tolist()} for i, v in enumerate(vecs)]
+        self._reply(200, {"object": "list", "model": body.get("model", self.model), "data": data})
+
+
+def start_stub_server(host="127.0.0.1", port=8081, dim=1024, latency=0.0, per_item_latency=0.0, max_tokens=None):
+    """
+    background thread에서 stub 서버를 띄운다
+    반환 결과 : ThreadingHTTPServer (종료는 server.shutdown())
+    """
+    handler = type("stub_handler", (_handler,), {"dim": dim, "latency": latency, "per_item_latency": per_item_latency,
+                                                 "max_tokens": max_tokens})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OpenAI 호환 /v1/embeddings stub 서버")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--latency", type=float, default=0.0, help="요청당 고정 지연(초)")
+    parser.add_argument("--per-item-latency", type=float, default=0.0, help="텍스트당 추가 지연(초)")
+    parser.add_argument("--max-tokens", type=int, default=None, help="입력 1건의 최대 token 수 (llama-server의 -ub)")
+    args = parser.parse_args()
+    server = start_stub_server(args.host, args.port, args.dim, args.latency, args.per_item_latency, args.max_tokens)
+    print(f"stub embedding server : http://{args.host}:{args.port}/v1/embeddings (dim={args.dim})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
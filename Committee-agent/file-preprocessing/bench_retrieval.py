@@ -0,0 +1,216 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from _embed_client import llama_embedding_client
+from _faiss import faiss_vector_db
+from _stub_embed_server import start_stub_server
+
+# faiss_vector_db 검색 benchmark (llama-server 없이 stub 임베딩 서버로 실행)
+# - 합성 chunk N개를 stub 서버로 한 번만 임베딩한 뒤 index 종류별로 _build
+# - index 종류별로 구축 시간, 단건 검색 latency(p50/p95/p99, query 임베딩 포함), batch 검색 QPS, RSS, recall@k 출력
+# - RSS는 index마다 새 프로세스에서 저장된 index를 열고 검색한 뒤 측정 (serve_rss_mb), index_rss_mb는 그중 index를 열기 전 대비 증가분
+#   (한 프로세스에서 재면 corpus와 앞서 만든 index들의 메모리가 누적되어 index 종류별 비교가 되지 않는다)
+# - 새 프로세스가 저장된 index를 열어 첫 결과를 받기까지의 시간(time-to-first-query)을 일반 read / mmap 각각 측정
+# 실행 예 : python bench_retrieval.py --sizes 10000,100000 --types flat,hnsw,ivf,sq8,pq --dim 1024 --latency 0.002
+# (stub 서버는 이 script 안에서 --port로 띄운다. 실제 llama-server가 같은 port를 쓰고 있으면 다른 port 지정)
+
+_SYLLABLES = "가나다라마바사아자차카타파하은행리스크관리위원회결의안건보고심사승인여신한도금리시장운영신용"
+
+
+def synthetic_corpus(n, n_words=40, vocab_size=5000, seed=0):
+    """단어 빈도가 Zipf 분포를 따르는 합성 chunk n개 (같은 seed면 항상 같은 결과)"""
+    rng = np.random.default_rng(seed)
+    syl = np.array(list(_SYLLABLES))
+    vocab = ["".join(rng.choice(syl, rng.integers(2, 5))) for _ in range(vocab_size)]
+    p = 1.0 / np.arange(1, vocab_size + 1)
+    p /= p.sum()
+    words = rng.choice(vocab_size, size=(n, n_words), p=p)
+    return [" ".join(vocab[w] for w in row) for row in words]
+
+
+def synthetic_queries(texts, n, n_words=6, seed=1):
+    """corpus의 chunk에서 일부 단어를 뽑아 만든 query (정답 chunk가 존재하도록)"""
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(texts), n, replace=False)
+    queries = []
+    for i in picks:
+        words = texts[i].split()
+        queries.append(" ".join(words[j] for j in np.sort(rng.choice(len(words), min(n_words, len(words)), replace=False))))
+    return queries
+
+
+def rss_mb():
+    """
+    현재 프로세스의 상주 메모리(MB). psutil -> /proc/self/statm(Linux) 순서로 시도하고,
+    둘 다 없으면 resource의 최대(peak) RSS, 그것도 없으면 None
+    """
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 2**20
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+    except ImportError:
+        return None
+
+
+def _percentiles(latencies_ms):
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    return {"p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99)}
+
+
+def serving_rss(save_dir, queries, port, k=10, **db_kwargs):
+    """
+    새 python 프로세스에서 save_dir의 index를 열고 queries를 검색한 뒤의 RSS(MB)
+    반환 결과 : {"serve_rss_mb": 검색 후 RSS, "index_rss_mb": index를 열기 전 대비 증가분} (측정할 수 없으면 None)
+    """
+    job = {"save_dir": save_dir, "queries": queries, "port": port, "k": k, "db_kwargs": db_kwargs}
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--measure-rss"], input=json.dumps(job),
+                          capture_output=True, text=True, encoding="utf-8",
+                          cwd=os.path.dirname(os.path.abspath(__file__)))
+    if proc.returncode != 0:
+        print("RSS 측정 실패 : ", proc.stderr[-500:])
+        return {"serve_rss_mb": None, "index_rss_mb": None}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _measure_rss_child():
+    """serving_rss의 자식 프로세스 : stdin의 job대로 index를 열고 검색한 뒤 RSS를 json 한 줄로 출력"""
+    job = json.loads(sys.stdin.read())
+    client = llama_embedding_client(f"http://127.0.0.1:{job['port']}", batch_size=64, max_batch_tokens=8192)
+    client.embed(job["queries"][:1]) # HTTP 연결 등 index와 무관한 메모리를 먼저 올려둔다
+    before = rss_mb()
+    db = faiss_vector_db(job["save_dir"], "faiss_ip.index", "faiss_docs.json", client=client, **job["db_kwargs"])
+    for start in range(0, len(job["queries"]), 64):
+        db.search_many(job["queries"][start:start + 64], job["k"])
+    after = rss_mb()
+    client.close()
+    print(json.dumps({"serve_rss_mb": after, "index_rss_mb": None if before is None else after - before}))
+
+
+def time_to_first_query(save_dir, query, k=10, **db_kwargs):
+    """저장된 index를 새 db 객체로 열어 첫 검색 결과를 받을 때까지의 시간(ms)과 startup_report"""
+    db = faiss_vector_db(save_dir, "faiss_ip.index", "faiss_docs.json", **db_kwargs)
+    t0 = time.perf_counter()
+    db._search_db(query, k)
+    return (time.perf_counter() - t0) * 1000, db.startup_report()
+
+
+def bench_index(work_dir, texts, vecs, queries, index_type, k=10, batch=64, port=None, **db_kwargs):
+    """index 하나를 만들고 측정. 반환 결과 : 측정값 dict"""
+    db_kwargs = dict(db_kwargs, query_cache_size=0) # 같은 query를 반복하므로 결과 캐시는 끄고 측정
+    save_dir = os.path.join(work_dir, index_type)
+    shutil.rmtree(save_dir, ignore_errors=True)
+    os.makedirs(save_dir)
+    db = faiss_vector_db(save_dir, "faiss_ip.index", "faiss_docs.json", index_type=index_type, **db_kwargs)
+
+    t0 = time.perf_counter()
+    db._build(texts, vecs)
+    build_s = time.perf_counter() - t0
+    searcher = db._get_searcher()
+
+    # 단건 검색 (query 임베딩 HTTP 왕복 포함)
+    searcher.search(queries[0], k)
+    latencies = []
+    for q in queries:
+        t0 = time.perf_counter()
+        searcher.search(q, k)
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+    # batch 검색 (query batch를 한 번에 임베딩 + 한 번의 index.search)
+    t0 = time.perf_counter()
+    for start in range(0, len(queries), batch):
+        searcher.search_many(queries[start:start + batch], k)
+    qps = len(queries) / (time.perf_counter() - t0)
+
+    report = db.report(k=k)
+    ttfq, _ = time_to_first_query(save_dir, queries[-1], k, **db_kwargs)
+    ttfq_mmap, _ = time_to_first_query(save_dir, queries[-1], k, mmap_index=True, **db_kwargs)
+    out = {"type": report["type"], "ntotal": report["ntotal"], "build_s": build_s, "qps": qps,
+           "ttfq_ms": ttfq, "ttfq_mmap_ms": ttfq_mmap}
+    out.update(_percentiles(latencies))
+    if port is not None:
+        out.update(serving_rss(save_dir, queries, port, k, **{key: v for key, v in db_kwargs.items() if key != "client"}))
+    out.update({"bytes_per_vector": report["bytes_per_vector"], f"recall@{k}": report.get(f"recall@{k}")})
+    return out
+
+
+def run(sizes, types, dim=1024, k=10, n_queries=500, latency=0.0, per_item_latency=0.0, port=8091,
+        work_dir=None, **db_kwargs):
+    server = start_stub_server(port=port, dim=dim, latency=latency, per_item_latency=per_item_latency)
+    client = llama_embedding_client(f"http://127.0.0.1:{port}", batch_size=64, max_batch_tokens=8192)
+    work_dir = work_dir or tempfile.mkdtemp(prefix="faiss_bench_")
+    results = []
+    try:
+        for n in sizes:
+            texts = synthetic_corpus(n)
+            queries = synthetic_queries(texts, min(n_queries, n))
+            t0 = time.perf_counter()
+            vecs = client.embed(texts)
+            embed_s = time.perf_counter() - t0
+            print(f"[{n}] 임베딩 {embed_s:.1f}s ({n / embed_s:.0f} chunk/s)")
+
+            for index_type in types:
+                row = bench_index(work_dir, texts, vecs, queries, index_type, k, port=port, client=client, **db_kwargs)
+                row.update({"n": n, "embed_s": embed_s})
+                results.append(row)
+                print(json.dumps(row, ensure_ascii=False))
+    finally:
+        client.close()
+        server.shutdown()
+    return results
+
+
+def _print_table(results, k):
+    cols = ["n", "type", "build_s", "qps", "p50_ms", "p95_ms", "p99_ms", "ttfq_ms", "ttfq_mmap_ms", "serve_rss_mb",
+            "index_rss_mb",
+            "bytes_per_vector", f"recall@{k}"]
+    print(" | ".join(f"{c:>14}" for c in cols))
+    for row in results:
+        cells = []
+        for c in cols:
+            v = row.get(c)
+            cells.append(f"{v:>14.3f}" if isinstance(v, float) else f"{str(v):>14}")
+        print(" | ".join(cells))
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--measure-rss"]:
+        _measure_rss_child()
+        sys.exit(0)
+    parser = argparse.ArgumentParser(description="faiss_vector_db 검색 benchmark (stub 임베딩 서버 사용)")
+    parser.add_argument("--sizes", default="10000", help="chunk 수 목록 (쉼표 구분, 예: 10000,100000,1000000)")
+    parser.add_argument("--types", default="flat,hnsw,ivf,sq8,pq", help="index 종류 목록 (쉼표 구분)")
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.0, help="stub 서버 요청당 지연(초)")
+    parser.add_argument("--per-item-latency", type=float, default=0.0, help="stub 서버 텍스트당 지연(초)")
+    parser.add_argument("--port", type=int, default=8091)
+    parser.add_argument("--work-dir", default=None, help="index 저장 위치 (기본 임시 디렉토리)")
+    parser.add_argument("--lexical", action="store_true", help="BM25 index도 같이 구축")
+    parser.add_argument("--out", default=None, help="결과를 저장할 json 경로")
+    args = parser.parse_args()
+
+    results = run([int(s) for s in args.sizes.split(",")], args.types.split(","), args.dim, args.k, args.queries,
+                  args.latency, args.per_item_latency, args.port, args.work_dir, lexical=args.lexical)
+    _print_table(results, args.k)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,109 @@
+# Benchmark for load_and_chunk_pdfs: sequential vs process-pool extraction
+# - Runs against an existing PDF folder (--pdf-dir) or generates synthetic text PDFs (--generate N)
+# - Checks that every mode returns exactly the same chunks, then prints wall time and speedup
+# - Worker runs parse every file (extraction cache disabled); a last run shows a warm extraction cache
+#
+# Example:
+#   python Committee-agent_bench_pdf_loader.py --generate 64 --pages 40 --workers 1,4,8
+
+import argparse
+import importlib
+import os
+import sys
+import tempfile
+import time
+from typing import List
+
+from pypdf import PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+pdf_loader = importlib.import_module("Committee-agent_pdf_loader")
+
+
+def _escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_synthetic_pdfs(out_dir: str, n_files: int, pages: int = 20, lines_per_page: int = 45) -> List[str]:
+    """
+    Write `n_files` text-only PDFs (Helvetica, ASCII) with `pages` pages each into `out_dir`.
+    Returns the written paths.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for f in range(n_files):
+        writer = PdfWriter()
+        for p in range(pages):
+            page = writer.add_blank_page(width=612, height=792)
+            font = DictionaryObject({
+                NameObject("/Type"): NameObject("/Font"),
+                NameObject("/Subtype"): NameObject("/Type1"),
+                NameObject("/BaseFont"): NameObject("/Helvetica"),
+            })
+            page[NameObject("/Resources")] = DictionaryObject({
+                NameObject("/Font"): DictionaryObject({NameObject("/F1"): writer._add_object(font)})
+            })
+            ops = ["BT", "/F1 10 Tf", "14 TL", "40 760 Td"]
+            for line in range(lines_per_page):
+                words = " ".join(f"item{(f * 31 + p * 7 + line * 3 + w) % 997}" for w in range(9))
+                ops.append(f"({_escape(f'File {f} page {p} line {line}: {words}.')}) Tj T*")
+            ops.append("ET")
+            stream = DecodedStreamObject()
+            stream.set_data("\n".join(ops).encode("latin-1"))
+            page[NameObject("/Contents")] = writer._add_object(stream)
+        path = os.path.join(out_dir, f"synthetic_{f:04d}.pdf")
+        with open(path, "wb") as fh:
+            writer.write(fh)
+        paths.append(path)
+    return paths
+
+
+def run(pdf_dir: str, workers_list: List[int], chunk_size: int = 1000, overlap: int = 300, repeat: int = 1):
+    baseline = None
+    rows = []
+    pdf_loader.set_extraction_cache(None)
+    for workers in workers_list:
+        best = float("inf")
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            chunks = pdf_loader.load_and_chunk_pdfs(pdf_dir, chunk_size=chunk_size, overlap=overlap, workers=workers)
+            best = min(best, time.perf_counter() - t0)
+        if baseline is None:
+            baseline = (chunks, best)
+        elif chunks != baseline[0]:
+            raise AssertionError(f"workers={workers} returned different chunks than workers={workers_list[0]}")
+        rows.append({"workers": workers, "seconds": best, "speedup": baseline[1] / best, "chunks": len(chunks)})
+        print(f"workers={workers:>3}  {best:8.2f}s  speedup x{baseline[1] / best:5.2f}  chunks={len(chunks)}")
+
+    # warm extraction cache: fill once, then time a run that skips parsing
+    pdf_loader.set_extraction_cache(pdf_loader.ExtractionCache(tempfile.mkdtemp(prefix="pdf_cache_")))
+    pdf_loader.load_and_chunk_pdfs(pdf_dir, chunk_size=chunk_size, overlap=overlap)
+    t0 = time.perf_counter()
+    chunks = pdf_loader.load_and_chunk_pdfs(pdf_dir, chunk_size=chunk_size, overlap=overlap)
+    warm = time.perf_counter() - t0
+    if chunks != baseline[0]:
+        raise AssertionError("cached extraction returned different chunks")
+    rows.append({"workers": "cached", "seconds": warm, "speedup": baseline[1] / warm, "chunks": len(chunks)})
+    print(f"cached       {warm:8.2f}s  speedup x{baseline[1] / warm:5.2f}  chunks={len(chunks)}")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="load_and_chunk_pdfs extraction benchmark")
+    parser.add_argument("--pdf-dir", default=None, help="folder of PDFs to benchmark (default: generate synthetic PDFs)")
+    parser.add_argument("--generate", type=int, default=32, help="number of synthetic PDFs when --pdf-dir is not given")
+    parser.add_argument("--pages", type=int, default=20, help="pages per synthetic PDF")
+    parser.add_argument("--workers", default=f"1,{os.cpu_count() or 1}", help="comma-separated worker counts")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--overlap", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=1, help="runs per setting (best time is reported)")
+    args = parser.parse_args()
+
+    pdf_dir = args.pdf_dir
+    if pdf_dir is None:
+        pdf_dir = tempfile.mkdtemp(prefix="pdf_bench_")
+        t0 = time.perf_counter()
+        make_synthetic_pdfs(pdf_dir, args.generate, args.pages)
+        print(f"generated {args.generate} PDFs x {args.pages} pages in {pdf_dir} ({time.perf_counter() - t0:.1f}s)")
+    run(pdf_dir, [int(w) for w in args.workers.split(",")], args.chunk_size, args.overlap, args.repeat)
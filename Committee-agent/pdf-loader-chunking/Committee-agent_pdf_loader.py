@@ -2,37 +2,292 @@
 # - Extracts text from PDFs in a directory
 # - Produces overlapping character-based chunks
 # - chunk_size and overlap are configurable per-call
+# - PDF extraction can run in a process pool (workers > 1); output order is unchanged
+# - iter_chunks streams chunks file by file and page by page with bounded memory
+# - Extracted page texts are cached on disk, keyed by file content hash + extractor version
+# - Pages are joined with a plain blank line; chunks get page_start/page_end from page start offsets
+# - mode="sentences" packs whole sentences (Korean 다./요., list items, ...) up to a token budget
 
+import hashlib
+import json
+from bisect import bisect_right
 import os
-from typing import List, Dict, Iterable
+import re
+import time
+import weakref
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Callable, List, Dict, Iterable, Iterator, Optional, Tuple
+import numpy as np
+import pypdf
 from pypdf import PdfReader
 
+# Page boundaries are kept as offsets (see extract_text_and_pages), not as marker text in the payload.
+PAGE_SEPARATOR = "\n\n"
 
-def extract_text_from_pdf(path: str) -> str:
+# Bump the trailing number whenever extraction output changes, so stale cache entries are not reused.
+EXTRACTOR_VERSION = f"pypdf-{pypdf.__version__}/1"
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "COMMITTEE_AGENT_PDF_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "committee-agent", "pdf_text"),
+)
+
+
+class ExtractionCache:
     """
-    Extracts text from all pages of a PDF file using pypdf.
-    Returns a single concatenated string with simple page separators.
+    Persistent cache of extracted PDF page texts.
+
+    - Key: blake2b of the file bytes + EXTRACTOR_VERSION (renaming or moving a file still hits,
+      editing it or upgrading pypdf misses).
+    - Value: zlib-compressed JSON list of page texts, one file per entry, written atomically.
+    - Size limit: when the total size exceeds max_bytes, least recently used entries
+      (by mtime, refreshed on every hit) are deleted.
+    - Best effort: an unusable cache directory or an unencodable page only skips caching,
+      extraction itself never fails because of the cache.
     """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = 512 * 2**20):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._total_bytes: Optional[int] = None
+
+    def key(self, path: str) -> str:
+        h = hashlib.blake2b(digest_size=20)
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        h.update(EXTRACTOR_VERSION.encode("utf-8"))
+        return h.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + ".json.z")
+
+    def get(self, key: str) -> Optional[List[str]]:
+        try:
+            with open(self._path(key), "rb") as f:
+                pages = json.loads(zlib.decompress(f.read()).decode("utf-8", "surrogatepass"))
+        except (OSError, ValueError, zlib.error):
+            self.misses += 1
+            return None
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass  # read-only cache: still a hit, only the LRU order is not refreshed
+        self.hits += 1
+        return pages
+
+    def put(self, key: str, pages: Iterable[str]) -> None:
+        for _ in self.put_streaming(key, pages):
+            pass
+
+    def put_streaming(self, key: str, pages: Iterable[str]) -> Iterator[str]:
+        """
+        Yield `pages` unchanged while compressing them into the cache entry for `key`,
+        so the page texts are never collected in memory.
+        The entry is committed once every page has been consumed; if the consumer stops early,
+        the entry grows past max_bytes, or writing fails, nothing is stored.
+        """
+        tmp = f"{self._path(key)}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            f = open(tmp, "wb")
+        except OSError:
+            yield from pages
+            return
+        comp = zlib.compressobj(6)
+        written = 0
+        n_pages = 0
+        ok = True
+        complete = False
+        try:
+            for page_text in pages:
+                if ok:
+                    try:
+                        piece = ("," if n_pages else "[") + json.dumps(page_text, ensure_ascii=False)
+                        written += f.write(comp.compress(piece.encode("utf-8", "surrogatepass")))
+                        ok = written <= self.max_bytes
+                    except (OSError, UnicodeError):
+                        ok = False
+                n_pages += 1
+                yield page_text
+            if ok:
+                try:
+                    written += f.write(comp.compress(b"]" if n_pages else b"[]"))
+                    written += f.write(comp.flush())
+                    complete = written <= self.max_bytes
+                except OSError:
+                    pass
+        finally:
+            try:
+                f.close()
+            except OSError:
+                complete = False
+            if complete:
+                self._commit(tmp, key, written)
+            else:
+                self._remove(tmp)
+
+    def _commit(self, tmp: str, key: str, nbytes: int) -> None:
+        try:
+            os.replace(tmp, self._path(key))
+            if self._total_bytes is None:
+                self._total_bytes = sum(size for _, size, _ in self._entries())
+            else:
+                self._total_bytes += nbytes
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+        except OSError:
+            self._remove(tmp)
+
+    def _entries(self):
+        """(path, size, mtime) of every cache entry"""
+        out = []
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if entry.name.endswith(".json.z"):
+                        try:
+                            st = entry.stat()
+                        except OSError:
+                            continue  # removed by another process
+                        out.append((entry.path, st.st_size, st.st_mtime))
+        except OSError:
+            pass  # missing or unreadable cache directory
+        return out
+
+    def _remove(self, path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+    def _evict(self) -> None:
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+        self._total_bytes = total
+
+    def purge(self, older_than_days: Optional[float] = None) -> int:
+        """
+        Delete cache entries (all of them, or only those unused for `older_than_days` days).
+        Returns the number of deleted entries.
+        """
+        cutoff = None if older_than_days is None else time.time() - older_than_days * 86400
+        removed = 0
+        for path, _, mtime in self._entries():
+            if (cutoff is None or mtime < cutoff) and self._remove(path):
+                removed += 1
+        self._total_bytes = None
+        return removed
+
+    def stats(self) -> Dict:
+        entries = self._entries()
+        return {"entries": len(entries), "bytes": sum(size for _, size, _ in entries), "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses}
+
+
+_extraction_cache: Optional[ExtractionCache] = ExtractionCache()
+
+
+def set_extraction_cache(cache: Optional[ExtractionCache]) -> None:
+    """Replace the module-wide extraction cache (None disables caching)."""
+    global _extraction_cache
+    _extraction_cache = cache
+
+
+def get_extraction_cache() -> Optional[ExtractionCache]:
+    return _extraction_cache
+
+
+def purge_extraction_cache(older_than_days: Optional[float] = None) -> int:
+    """Purge the module-wide extraction cache; see ExtractionCache.purge."""
+    return _extraction_cache.purge(older_than_days) if _extraction_cache is not None else 0
+
+
+def _extract_pages(path: str) -> Iterator[str]:
     reader = PdfReader(path)
-    texts = []
-    for i, page in enumerate(reader.pages):
+    for page in reader.pages:
         try:
             page_text = page.extract_text() or ""
         except Exception:
             # Fallback: ignore page extraction errors and continue
             page_text = ""
-        texts.append(page_text)
-    # join with a page separator to preserve page boundaries for metadata if needed
-    return "\n\n[PAGE_BREAK]\n\n".join(texts)
+        yield page_text
+
 
+def iter_pdf_pages(path: str, use_cache: bool = True) -> Iterator[str]:
+    """
+    Yields the text of each page of a PDF file, one page at a time.
+    Pages whose extraction fails yield an empty string.
+    With use_cache, a file whose content was extracted before is served from the extraction
+    cache without parsing; otherwise each page is compressed into the cache entry as it is
+    yielded, and the entry is committed once the file is fully read.
+    """
+    cache = _extraction_cache if use_cache else None
+    if cache is None:
+        yield from _extract_pages(path)
+        return
+    key = cache.key(path)
+    pages = cache.get(key)
+    if pages is not None:
+        yield from pages
+        return
+    yield from cache.put_streaming(key, _extract_pages(path))
+
+
+def extract_text_and_pages(path: str, use_cache: bool = True) -> Tuple[str, List[int]]:
+    """
+    Extracts text from all pages of a PDF file using pypdf.
+    Returns (text, page_starts): the pages joined with PAGE_SEPARATOR, and the char offset in
+    `text` where each page begins (page_starts[0] == 0, one entry per page, ascending).
+    Checks the extraction cache first (see ExtractionCache), so unchanged files are not re-parsed.
+    """
+    pages = list(iter_pdf_pages(path, use_cache))
+    page_starts = []
+    offset = 0
+    for page_text in pages:
+        page_starts.append(offset)
+        offset += len(page_text) + len(PAGE_SEPARATOR)
+    return PAGE_SEPARATOR.join(pages), page_starts
+
+
+def extract_text_from_pdf(path: str, use_cache: bool = True) -> str:
+    """
+    Extracts text from all pages of a PDF file using pypdf.
+    Returns a single concatenated string with pages separated by a blank line.
+    Use extract_text_and_pages to also get the page boundaries.
+    """
+    return extract_text_and_pages(path, use_cache)[0]
+
+
+def _page_range(page_starts: List[int], start: int, end: int) -> Tuple[int, int]:
+    """1-based (first, last) page covered by text[start:end]; a separator belongs to the page before it."""
+    return bisect_right(page_starts, start), bisect_right(page_starts, max(start, end - 1))
 
-def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 300) -> Iterable[Dict]:
+
+def chunk_text(
+    text: str,
+    chunk_size: int = 1000,
+    overlap: int = 300,
+    page_starts: Optional[List[int]] = None,
+) -> Iterable[Dict]:
     """
     Break `text` into chunks of `chunk_size` characters with `overlap` characters overlap.
     Yields dicts containing:
       - "text": chunk text
       - "start": start char index (inclusive)
       - "end": end char index (exclusive)
+      - "page_start" / "page_end": 1-based first and last page of the chunk
+        (only when `page_starts` from extract_text_and_pages is given)
     """
     if chunk_size <= 0:
         raise ValueError("chunk_size must be a positive integer")
@@ -46,16 +301,353 @@ def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 300) -> Iterabl
     while start < text_length:
         end = start + chunk_size
         chunk = text[start:end]
-        yield {"text": chunk, "start": start, "end": min(end, text_length)}
+        chunk_meta = {"text": chunk, "start": start, "end": min(end, text_length)}
+        if page_starts is not None:
+            chunk_meta["page_start"], chunk_meta["page_end"] = _page_range(page_starts, start, chunk_meta["end"])
+        yield chunk_meta
         # advance start by chunk_size - overlap
         start += chunk_size - overlap
 
 
+def chunk_pages(pages: Iterable[str], chunk_size: int = 1000, overlap: int = 300) -> Iterator[Dict]:
+    """
+    Streaming version of chunk_text over `PAGE_SEPARATOR.join(pages)`.
+
+    Yields exactly the same chunks (text, start, end, page_start, page_end) as chunk_text on the
+    joined text with its page_starts, but only keeps the text from the current chunk start
+    onwards, so memory stays around chunk_size + one page regardless of document length
+    (plus one int per page for the page offsets). Pages are pulled lazily.
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be a positive integer")
+    if overlap < 0:
+        raise ValueError("overlap must be non-negative")
+    if overlap >= chunk_size:
+        raise ValueError("overlap must be smaller than chunk_size")
+
+    step = chunk_size - overlap
+    buf, buf_offset = "", 0  # buf holds the joined text from offset buf_offset onwards
+    total = 0  # length of the joined text seen so far
+    page_starts = []
+    start = 0
+    for i, page_text in enumerate(pages):
+        piece = page_text if i == 0 else PAGE_SEPARATOR + page_text
+        buf += piece
+        total += len(piece)
+        page_starts.append(total - len(page_text))
+        while start + chunk_size <= total:
+            rel = start - buf_offset
+            first, last = _page_range(page_starts, start, start + chunk_size)
+            yield {"text": buf[rel:rel + chunk_size], "start": start, "end": start + chunk_size,
+                   "page_start": first, "page_end": last}
+            start += step
+        # drop text that no later chunk can reach
+        if start > buf_offset:
+            buf = buf[start - buf_offset:]
+            buf_offset = start
+    while start < total:
+        rel = start - buf_offset
+        end = min(start + chunk_size, total)
+        first, last = _page_range(page_starts, start, end)
+        yield {"text": buf[rel:rel + chunk_size], "start": start, "end": end, "page_start": first, "page_end": last}
+        start += step
+
+
+# A line that starts a list item: "- ", "• ", "1. ", "2) ", "가. ", "(3) ", "① ", ...
+_LIST_MARKER = r"(?:[-•·▪◦○●■□※*]|\d{1,3}[.)]|[가나다라마바사아자차카타파하][.)]|\(\d{1,3}\)|[①-⑳])\s"
+
+# Whitespace runs that separate two sentences; the next sentence starts where the match ends.
+_SENTENCE_BREAK = re.compile(
+    r"(?=\s)(?:"  # every break is a whitespace run; cheap rejection everywhere else
+    r"(?<=[.!?。…])"  # 다. 요. and other sentence-final punctuation, but not a "1." / "12." / "가." list marker
+    r"(?<!(?<!\S)[\d가나다라마바사아자차카타파하]\.)(?<!(?<!\S)\d\d\.)(?<!(?<!\S)\d\d\d\.)\s+"
+    r"|(?<=[다요])[ \t]*\n\s*"  # 다/요 at the end of a line without a period
+    r"|\s*\n[ \t]*\n\s*"  # blank line (paragraphs, page boundaries)
+    r"|[ \t]*\n\s*(?=" + _LIST_MARKER + r")"  # a line starting with a list marker
+    r")"
+)
+
+# cached wrappers live only as long as the caller's counter does
+_token_counters: "weakref.WeakKeyDictionary[Callable[[str], int], Callable[[str], int]]" = weakref.WeakKeyDictionary()
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Conservative token count without a tokenizer: UTF-8 bytes / 3, rounded up.
+    A Hangul syllable is 3 bytes and at most about one token; Latin text is 3-4 chars per token.
+    """
+    return -(-len(text.encode("utf-8", "surrogatepass")) // 3)
+
+
+def _cached_counter(count_tokens: Callable[[str], int]) -> Callable[[str], int]:
+    """
+    lru-cached wrapper of `count_tokens`, shared across calls with the same counter object
+    (headers, footers and boilerplate repeat). The cache is dropped with the counter; counters
+    that cannot be weakly referenced get a cache for this call only.
+    """
+    if hasattr(count_tokens, "cache_info"):
+        return count_tokens  # already cached (e.g. llama_embedding_client.count_tokens)
+    try:
+        cached = _token_counters.get(count_tokens)
+    except TypeError:
+        return lru_cache(maxsize=65536)(count_tokens)
+    if cached is None:
+        ref = weakref.ref(count_tokens)  # a strong reference from the cache would keep the entry alive forever
+        cached = _token_counters[count_tokens] = lru_cache(maxsize=65536)(lambda text: ref()(text))
+    return cached
+
+
+def split_sentences(text: str) -> Tuple[List[int], List[int]]:
+    """
+    Sentence spans of `text` as (starts, ends) char offsets, without the whitespace between them.
+    Breaks after sentence-final punctuation (다. 요. . ? !), after 다/요 at a line end,
+    at blank lines, and before lines that start with a list marker.
+    """
+    starts, ends = [], []
+    pos = len(text) - len(text.lstrip())
+    for m in _SENTENCE_BREAK.finditer(text, pos):
+        if m.start() > pos:
+            starts.append(pos)
+            ends.append(m.start())
+        pos = m.end()
+    tail = len(text.rstrip())
+    if tail > pos:
+        starts.append(pos)
+        ends.append(tail)
+    return starts, ends
+
+
+def _estimate_span_tokens(text: str, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """estimate_tokens of every text[starts[i]:ends[i]] at once, from a prefix sum of UTF-8 byte lengths"""
+    cp = np.frombuffer(text.encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+    nbytes = 1 + (cp >= 0x80).astype(np.int64) + (cp >= 0x800) + (cp >= 0x10000)
+    prefix = np.concatenate([[0], np.cumsum(nbytes)])
+    return -(-(prefix[ends] - prefix[starts]) // 3)
+
+
+def _split_oversized(text, starts, ends, tokens, max_tokens, count):
+    """
+    Cut sentences longer than max_tokens into about equal-length pieces until every piece fits.
+    Each cut moves back to the nearest space or line break within a quarter piece, if there is one.
+    """
+    out_s, out_e, out_t = [], [], []
+    for s, e, t in zip(starts.tolist(), ends.tolist(), tokens.tolist()):
+        stack = [(s, e, t)]
+        while stack:
+            s, e, t = stack.pop()
+            if t <= max_tokens or e - s < 2:
+                out_s.append(s)
+                out_e.append(e)
+                out_t.append(t)
+                continue
+            n = -(-t // max_tokens)
+            bounds = [s + (e - s) * k // n for k in range(n + 1)]
+            slack = (e - s) // n // 4
+            for k in range(1, n):
+                space = max(text.rfind(" ", bounds[k] - slack, bounds[k]), text.rfind("\n", bounds[k] - slack, bounds[k]))
+                if space > bounds[k - 1]:
+                    bounds[k] = space
+            pieces = []
+            for a, b in zip(bounds, bounds[1:]):
+                piece = text[a:b]
+                a += len(piece) - len(piece.lstrip())
+                b -= len(piece) - len(piece.rstrip())
+                if b > a:
+                    pieces.append((a, b, count(text[a:b])))
+            stack.extend(reversed(pieces))
+    return np.asarray(out_s, dtype=np.int64), np.asarray(out_e, dtype=np.int64), np.asarray(out_t, dtype=np.int64)
+
+
+def chunk_sentences(
+    text: str,
+    max_tokens: int = 512,
+    overlap_sentences: int = 1,
+    count_tokens: Optional[Callable[[str], int]] = None,
+    page_starts: Optional[List[int]] = None,
+) -> Iterator[Dict]:
+    """
+    Pack whole sentences of `text` (see split_sentences) into chunks of at most `max_tokens` tokens.
+    Consecutive chunks share their last/first `overlap_sentences` sentences.
+
+    - count_tokens: tokens of one sentence, e.g. llama_embedding_client.count_tokens or
+      `lambda s: len(tokenizer.encode(s).ids)`; results are lru-cached. Default: estimate_tokens,
+      computed for all sentences at once.
+    - A chunk's budget is the sum of its sentence counts (the separating whitespace is not counted).
+    - A single sentence longer than max_tokens is cut into equal-length pieces.
+
+    Yields dicts with "text", "start", "end", "n_tokens" and, when `page_starts` is given,
+    "page_start" / "page_end" (as chunk_text).
+    """
+    if max_tokens <= 0:
+        raise ValueError("max_tokens must be a positive integer")
+    if overlap_sentences < 0:
+        raise ValueError("overlap_sentences must be non-negative")
+
+    starts, ends = split_sentences(text)
+    if not starts:
+        return
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    if count_tokens is None:
+        count = estimate_tokens
+        tokens = _estimate_span_tokens(text, starts, ends)
+    else:
+        count = _cached_counter(count_tokens)
+        tokens = np.fromiter((count(text[s:e]) for s, e in zip(starts.tolist(), ends.tolist())),
+                             dtype=np.int64, count=len(starts))
+    if tokens.max() > max_tokens:
+        starts, ends, tokens = _split_oversized(text, starts, ends, tokens, max_tokens, count)
+
+    # reach[i] = end (exclusive) of the longest sentence run starting at i that fits the budget, at least i + 1
+    n = len(starts)
+    prefix = np.concatenate([[0], np.cumsum(tokens)])
+    reach = np.searchsorted(prefix, prefix[:-1] + max_tokens, side="right") - 1
+    reach = np.maximum(reach, np.arange(1, n + 1)).tolist()
+    starts, ends, prefix = starts.tolist(), ends.tolist(), prefix.tolist()
+
+    i = 0
+    while i < n:
+        j = reach[i]
+        chunk_meta = {"text": text[starts[i]:ends[j - 1]], "start": starts[i], "end": ends[j - 1],
+                      "n_tokens": prefix[j] - prefix[i]}
+        if page_starts is not None:
+            chunk_meta["page_start"], chunk_meta["page_end"] = _page_range(page_starts, starts[i], ends[j - 1])
+        yield chunk_meta
+        if j >= n:
+            break
+        i = max(i + 1, j - overlap_sentences)
+
+
+def list_pdf_files(dir_path: str) -> List[str]:
+    """
+    Sorted filenames of the PDF files (case-insensitive .pdf) directly under `dir_path`.
+    """
+    return sorted(
+        [
+            f
+            for f in os.listdir(dir_path)
+            if os.path.isfile(os.path.join(dir_path, f))
+            and f.lower().endswith(".pdf")
+        ]
+    )
+
+
+def extract_texts(paths: List[str], workers: int = 1) -> Iterable[Tuple[str, List[int]]]:
+    """
+    Extract each PDF in `paths` with extract_text_and_pages, yielding (text, page_starts)
+    in the same order as `paths`.
+
+    - workers == 1: extract sequentially in this process.
+    - workers > 1: extract in a process pool with that many workers
+      (pypdf's extract_text is pure Python and CPU-bound, so threads would not help).
+    - workers == 0: use os.cpu_count() workers.
+    """
+    if workers < 0:
+        raise ValueError("workers must be non-negative")
+    if workers == 0:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(paths))
+    if workers <= 1:
+        for path in paths:
+            yield extract_text_and_pages(path)
+        return
+    # workers get the same extraction cache settings as this process
+    with ProcessPoolExecutor(max_workers=workers, initializer=set_extraction_cache,
+                             initargs=(_extraction_cache,)) as pool:
+        # map keeps input order; chunksize=1 so one large file does not hold back a batch of small ones
+        yield from pool.map(extract_text_and_pages, paths, chunksize=1)
+
+
+def _iter_file_chunks(full_path: str, chunk_size: int, overlap: int) -> Iterator[Dict]:
+    """
+    chunk_pages over one PDF, skipping files whose extracted text is blank (as load_and_chunk_pdfs does).
+    Chunks are held back only while everything seen so far is whitespace.
+    """
+    pending = []
+    seen_text = False
+    for chunk_meta in chunk_pages(iter_pdf_pages(full_path), chunk_size=chunk_size, overlap=overlap):
+        if seen_text:
+            yield chunk_meta
+            continue
+        pending.append(chunk_meta)
+        if chunk_meta["text"].strip():
+            seen_text = True
+            yield from pending
+            pending = []
+
+
+def _chunk_extracted(
+    text: str,
+    page_starts: List[int],
+    mode: str,
+    chunk_size: int,
+    overlap: int,
+    max_tokens: int,
+    overlap_sentences: int,
+    count_tokens: Optional[Callable[[str], int]],
+) -> Iterable[Dict]:
+    """Chunk one extracted file with chunk_text (mode="chars") or chunk_sentences (mode="sentences")."""
+    if mode == "sentences":
+        return chunk_sentences(text, max_tokens=max_tokens, overlap_sentences=overlap_sentences,
+                               count_tokens=count_tokens, page_starts=page_starts)
+    return chunk_text(text, chunk_size=chunk_size, overlap=overlap, page_starts=page_starts)
+
+
+def _chunk_metadata(filename: str, idx: int, chunk_meta: Dict, include_filenames: bool) -> Dict:
+    metadata = {"chunk_index": idx, "start": chunk_meta["start"], "end": chunk_meta["end"],
+                "page_start": chunk_meta["page_start"], "page_end": chunk_meta["page_end"]}
+    if "n_tokens" in chunk_meta:
+        metadata["n_tokens"] = chunk_meta["n_tokens"]
+    if include_filenames:
+        metadata["source"] = filename
+    return metadata
+
+
+def iter_chunks(
+    dir_path: str,
+    chunk_size: int = 1000,
+    overlap: int = 300,
+    include_filenames: bool = True,
+    mode: str = "chars",
+    max_tokens: int = 512,
+    overlap_sentences: int = 1,
+    count_tokens: Optional[Callable[[str], int]] = None,
+) -> Iterator[Dict]:
+    """
+    Lazily yield the same chunk dicts as load_and_chunk_pdfs, file by file and page by page.
+
+    Only the current page and the unfinished chunk window are kept in memory, so consumers
+    (summarizer, validator, faiss indexing) can start on the first chunk before the last PDF
+    is opened, and peak memory does not grow with the folder size. New cache entries are
+    written page by page; a cache hit loads that one file's page texts at once.
+    With mode="sentences" each file's text is held in memory while it is being chunked.
+    """
+    if mode not in ("chars", "sentences"):
+        raise ValueError(f"unknown chunking mode: {mode}")
+    for filename in list_pdf_files(dir_path):
+        full_path = os.path.join(dir_path, filename)
+        if mode == "chars":
+            file_chunks = _iter_file_chunks(full_path, chunk_size, overlap)
+        else:
+            text, page_starts = extract_text_and_pages(full_path)
+            if not text.strip():
+                continue
+            file_chunks = _chunk_extracted(text, page_starts, mode, chunk_size, overlap,
+                                           max_tokens, overlap_sentences, count_tokens)
+        for idx, chunk_meta in enumerate(file_chunks):
+            yield {"text": chunk_meta["text"], "metadata": _chunk_metadata(filename, idx, chunk_meta, include_filenames)}
+
+
 def load_and_chunk_pdfs(
     dir_path: str,
     chunk_size: int = 1000,
     overlap: int = 300,
     include_filenames: bool = True,
+    workers: int = 1,
+    mode: str = "chars",
+    max_tokens: int = 512,
+    overlap_sentences: int = 1,
+    count_tokens: Optional[Callable[[str], int]] = None,
 ) -> List[Dict]:
     """
     Load all PDF files from `dir_path`, extract text and chunk into overlapping pieces.
@@ -67,32 +659,38 @@ def load_and_chunk_pdfs(
           "source": "<filename.pdf>",
           "chunk_index": int,
           "start": int,
-          "end": int
+          "end": int,
+          "page_start": int,  # 1-based page where the chunk begins
+          "page_end": int,    # 1-based page where the chunk ends
+          "n_tokens": int     # mode="sentences" only
         }
       }
 
-    - chunk_size and overlap are configurable per-call.
+    - mode="chars" (default): chunk_size characters with `overlap` characters overlap.
+    - mode="sentences": whole sentences packed up to `max_tokens` tokens (measured with
+      `count_tokens`, default estimate_tokens), `overlap_sentences` sentences overlap; see chunk_sentences.
     - Only files ending with .pdf (case-insensitive) are processed.
+    - workers > 1 extracts files in a process pool (0 = one worker per CPU); the result
+      is identical to the sequential run (same file order and chunk indices).
     """
+    if mode not in ("chars", "sentences"):
+        raise ValueError(f"unknown chunking mode: {mode}")
+    if workers == 1:
+        return list(iter_chunks(dir_path, chunk_size=chunk_size, overlap=overlap, include_filenames=include_filenames,
+                                mode=mode, max_tokens=max_tokens, overlap_sentences=overlap_sentences,
+                                count_tokens=count_tokens))
+
     results = []
-    filenames = sorted(
-        [
-            f
-            for f in os.listdir(dir_path)
-            if os.path.isfile(os.path.join(dir_path, f))
-            and f.lower().endswith(".pdf")
-        ]
-    )
+    filenames = list_pdf_files(dir_path)
+    paths = [os.path.join(dir_path, f) for f in filenames]
 
-    for filename in filenames:
-        full_path = os.path.join(dir_path, filename)
-        text = extract_text_from_pdf(full_path)
+    for filename, (text, page_starts) in zip(filenames, extract_texts(paths, workers)):
         if not text.strip():
             # skip empty extraction
             continue
-        for idx, chunk_meta in enumerate(chunk_text(text, chunk_size=chunk_size, overlap=overlap)):
-            metadata = {"chunk_index": idx, "start": chunk_meta["start"], "end": chunk_meta["end"]}
-            if include_filenames:
-                metadata["source"] = filename
+        for idx, chunk_meta in enumerate(
+            _chunk_extracted(text, page_starts, mode, chunk_size, overlap, max_tokens, overlap_sentences, count_tokens)
+        ):
+            metadata = _chunk_metadata(filename, idx, chunk_meta, include_filenames)
             results.append({"text": chunk_meta["text"], "metadata": metadata})
     return results
\ No newline at end of file
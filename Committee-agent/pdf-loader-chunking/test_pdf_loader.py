@@ -0,0 +1,89 @@
+import importlib
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+loader = importlib.import_module("Committee-agent_pdf_loader")
+
+
+def _join(pages):
+    """The joined text and page_starts that extract_text_and_pages returns for `pages`."""
+    page_starts, offset = [], 0
+    for page_text in pages:
+        page_starts.append(offset)
+        offset += len(page_text) + len(loader.PAGE_SEPARATOR)
+    return loader.PAGE_SEPARATOR.join(pages), page_starts
+
+
+def _page_of(page_starts, i):
+    """1-based page containing char i (a separator belongs to the page before it)."""
+    return max(p for p, s in enumerate(page_starts) if s <= i) + 1
+
+
+def _random_pages(rng):
+    return ["".join(rng.choice("ab \n") for _ in range(rng.randint(0, 40))) for _ in range(rng.randint(0, 8))]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_chunk_pages_matches_chunk_text(seed):
+    rng = random.Random(seed)
+    for _ in range(100):
+        pages = _random_pages(rng)
+        chunk_size = rng.randint(1, 30)
+        overlap = rng.randint(0, chunk_size - 1)
+        text, page_starts = _join(pages)
+        expected = list(loader.chunk_text(text, chunk_size, overlap, page_starts=page_starts))
+        assert list(loader.chunk_pages(iter(pages), chunk_size, overlap)) == expected
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_chunk_text_page_range(seed):
+    rng = random.Random(seed)
+    for _ in range(100):
+        pages = _random_pages(rng)
+        chunk_size = rng.randint(1, 30)
+        overlap = rng.randint(0, chunk_size - 1)
+        text, page_starts = _join(pages)
+        for chunk in loader.chunk_text(text, chunk_size, overlap, page_starts=page_starts):
+            assert chunk["text"] == text[chunk["start"]:chunk["end"]]
+            assert chunk["page_start"] == _page_of(page_starts, chunk["start"])
+            assert chunk["page_end"] == _page_of(page_starts, max(chunk["start"], chunk["end"] - 1))
+
+
+def test_page_range_at_boundaries():
+    text, page_starts = _join(["abcd", "efgh", "ijkl"])  # pages start at 0, 6, 12
+    chunks = list(loader.chunk_text(text, chunk_size=6, overlap=0, page_starts=page_starts))
+    assert [(c["start"], c["end"]) for c in chunks] == [(0, 6), (6, 12), (12, 16)]
+    # the separator after a page belongs to that page, so each chunk stays on one page
+    assert [(c["page_start"], c["page_end"]) for c in chunks] == [(1, 1), (2, 2), (3, 3)]
+    spanning = list(loader.chunk_text(text, chunk_size=8, overlap=0, page_starts=page_starts))
+    assert [(c["page_start"], c["page_end"]) for c in spanning] == [(1, 2), (2, 3)]
+
+
+def test_chunk_pages_empty():
+    assert list(loader.chunk_pages([])) == []
+    assert list(loader.chunk_pages(["", ""], chunk_size=4, overlap=1)) == list(
+        loader.chunk_text("\n\n", chunk_size=4, overlap=1, page_starts=[0, 2]))
+
+
+@pytest.mark.parametrize("chunk_size, overlap", [(0, 0), (10, -1), (10, 10)])
+def test_invalid_sizes(chunk_size, overlap):
+    with pytest.raises(ValueError):
+        list(loader.chunk_text("abc", chunk_size, overlap))
+    with pytest.raises(ValueError):
+        list(loader.chunk_pages(["abc"], chunk_size, overlap))
+
+
+def test_chunk_sentences_page_range():
+    pages = ["첫 문장이다. 둘째 문장이다.", "셋째 문장이다. 넷째 문장이다."]
+    text, page_starts = _join(pages)
+    chunks = list(loader.chunk_sentences(text, max_tokens=14, overlap_sentences=1, page_starts=page_starts))
+    assert any(c["page_start"] < c["page_end"] for c in chunks)
+    for chunk in chunks:
+        assert chunk["text"] == text[chunk["start"]:chunk["end"]]
+        assert chunk["n_tokens"] <= 14
+        assert chunk["page_start"] == _page_of(page_starts, chunk["start"])
+        assert chunk["page_end"] == _page_of(page_starts, chunk["end"] - 1)